@@ -3,6 +3,8 @@ sys.path.insert(0, '..')
 import mbam
 
 db = mbam.MMongo()
+# creates the indexes of the geodesic chunks and the reduction cache
+db.create_indexes()
 # updates the new template key
 key = {"zero": 0, "inf": 1}
 db.update_temp_key(key)
@@ -5,10 +5,77 @@ module GeoSender
     using ZMQ
     using JSON
 
+    const ADDRESS = "tcp://127.0.0.1:5556"
+    # Fields of an update sent by send_binary, in the order of their frames.
+    const BINARY_FIELDS = ("x", "v", "tau", "t", "j")
+
+    # A PUSH socket kept open for the whole geodesic.
+    mutable struct Sender
+        context::Context
+        socket::Socket
+        binary::Bool
+    end
+
+    function Sender(address=ADDRESS; hwm=1000, binary=false)
+        context = Context()
+        socket = Socket(context, PUSH)
+        # Sends block, instead of failing, once `hwm` messages are queued.
+        ZMQ.set_sndhwm(socket, hwm)
+        # Give queued messages a second to be delivered when closing.
+        ZMQ.set_linger(socket, 1000)
+        ZMQ.connect(socket, address)
+        return Sender(context, socket, binary)
+    end
+
+    function send(sender::Sender, data)
+        ZMQ.send(sender.socket, JSON.json(data))
+    end
+
+    # Sends several updates as a single message, a JSON array unless the
+    # sender was created with `binary=true`.
+    function send_batch(sender::Sender, batch)
+        if isempty(batch)
+            return
+        elseif sender.binary
+            send_binary(sender, batch)
+        else
+            ZMQ.send(sender.socket, JSON.json(batch))
+        end
+    end
+
+    # Sends several updates as a multipart message: a JSON header with the
+    # number of updates and the shape of each field, followed by one frame per
+    # field holding the raw Float64 values of that field for every update that
+    # has it. The header lists those updates (0-based) under "rows".
+    function send_binary(sender::Sender, batch)
+        fields = []
+        for f in BINARY_FIELDS
+            rows = [i for (i, u) in enumerate(batch) if haskey(u, f)]
+            if !isempty(rows)
+                push!(fields, (f, rows))
+            end
+        end
+        header = Dict(
+            "n"=>length(batch),
+            "fields"=>[Dict("name"=>f, "shape"=>collect(size(batch[rows[1]][f])), "rows"=>rows .- 1)
+                       for (f, rows) in fields],
+        )
+        ZMQ.send(sender.socket, JSON.json(header); more=true)
+        for (k, (f, rows)) in enumerate(fields)
+            data = Vector{Float64}(vcat([vec(batch[i][f]) for i in rows]...))
+            ZMQ.send(sender.socket, Message(data); more=(k < length(fields)))
+        end
+    end
+
+    function Base.close(sender::Sender)
+        ZMQ.close(sender.socket)
+        ZMQ.close(sender.context)
+    end
+
     function send_to_py(data)
         context = Context()
         data_sender = Socket(context, PUSH)
-        ZMQ.connect(data_sender, "tcp://127.0.0.1:5556")
+        ZMQ.connect(data_sender, ADDRESS)
 
         to_send = JSON.json(data)
         ZMQ.send(data_sender, to_send)
@@ -16,4 +83,3 @@ module GeoSender
         ZMQ.close(context)
     end
 end
-
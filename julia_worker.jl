@@ -0,0 +1,83 @@
+#!/usr/bin/env julia
+
+# A long-lived Julia process that runs the generated geodesic scripts, so
+# Julia only starts and compiles Models, Geometry and ZMQ once instead of once
+# per geodesic. Requests are JSON messages received on a ZMQ REP socket, see
+# mbam/worker.py:
+#
+#   {"cmd"=>"run", "script"=>path, "args"=>[...]}  starts a geodesic script
+#   {"cmd"=>"cancel", "job"=>id}                   stops the running script
+#   {"cmd"=>"status"}                              reports the running job
+#   {"cmd"=>"stop"}                                stops the worker
+#
+# One script runs at a time. The generated scripts yield after every step
+# while they run in a worker, and stop once GEO_CANCEL is set. A cancelled
+# script can take a moment to close its sender, so "run" waits for it instead
+# of replying busy.
+
+using ZMQ
+using JSON
+import Models
+import Geometry
+
+const GEO_CANCEL = Ref(false)
+const job = Ref{Any}(nothing)
+const job_id = Ref(0)
+
+function run_job(script, args)
+    empty!(ARGS)
+    append!(ARGS, args)
+    try
+        # A new module per script, so its globals never leak into the next.
+        Base.include(Module(:GeoJob), script)
+    catch E
+        println(E)
+    end
+end
+
+busy() = job[] !== nothing && !istaskdone(job[])
+
+function serve(address)
+    context = Context()
+    socket = Socket(context, REP)
+    ZMQ.bind(socket, address)
+    running = true
+    while running
+        request = JSON.parse(String(ZMQ.recv(socket)))
+        cmd = get(request, "cmd", "")
+        reply = Dict{String, Any}("ok"=>true)
+        if cmd == "run"
+            if busy() && GEO_CANCEL[]
+                wait(job[])
+            end
+            if busy()
+                reply = Dict{String, Any}("ok"=>false, "error"=>"busy", "job"=>job_id[])
+            else
+                GEO_CANCEL[] = false
+                job_id[] += 1
+                job[] = @async run_job(request["script"], Vector{String}(request["args"]))
+                reply["job"] = job_id[]
+            end
+        elseif cmd == "cancel"
+            if busy() && get(request, "job", job_id[]) == job_id[]
+                GEO_CANCEL[] = true
+            end
+        elseif cmd == "status"
+            reply["busy"] = busy()
+            reply["job"] = job_id[]
+        elseif cmd == "stop"
+            GEO_CANCEL[] = true
+            running = false
+        else
+            reply = Dict{String, Any}("ok"=>false, "error"=>"unknown command")
+        end
+        ZMQ.send(socket, JSON.json(reply))
+    end
+    if job[] !== nothing
+        wait(job[])
+    end
+    ZMQ.close(socket)
+    ZMQ.close(context)
+end
+
+serve(length(ARGS) > 0 ? ARGS[1] : "tcp://127.0.0.1:5560")
@@ -13,30 +13,51 @@ import time
 import zmq
 import sys
 from mbam import *
+from mbam.wire import recv_points
+from mbam.geodesic import geo_endpoint
+from mbam.mongo import stopped_with_error
 
 class Collector:
     """Uses ZMQ sockets to connect to the Julia Geodesic currently running,
     forwards the data collected to MongoDB.
+
+    Points are buffered and written with a single update once `flush_size`
+    points are waiting, or once the oldest waiting point is `flush_interval`
+    seconds old. Lower values reduce the delay before the data shows up in
+    MongoDB, higher values reduce the number of database round trips.
     """
-    def __init__(self, geo_id):
+    def __init__(self, geo_id, flush_size=50, flush_interval=.2, endpoint=None):
         """
         Parameters
         ----------
         geo_id : ``str``
             The MongoDB ObjectID as a string, corresponding to the current
             geodesic.
+        flush_size : ``int``
+            The number of points buffered before they are written.
+        flush_interval : ``float``
+            The maximum number of seconds a point is buffered before it is
+            written.
+        endpoint : ``str``
+            The ZMQ address the Julia geodesic pushes its data to. Defaults
+            to the address of the geodesic, see ``geo_endpoint``.
         """
         self.mongo = MMongo()
         self.geo_id = geo_id
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.endpoint = endpoint if endpoint else geo_endpoint(geo_id)
+        self.buffer = []
+        self.buffer_start = None
         self.start_sockets()
         self.collect()
 
     def start_sockets(self):
-        """Intializes the ZMQ socket on port 5556.
+        """Intializes the ZMQ socket on the endpoint of the geodesic.
         """
         context = zmq.Context()
         self.rec = context.socket(zmq.PULL)
-        self.rec.bind("tcp://127.0.0.1:5556")
+        self.rec.bind(self.endpoint)
 
     def collect(self):
         """Collects the data from the Julia Geodesic running.
@@ -44,18 +65,71 @@ class Collector:
         Will run until the process is killed manually, or until the
         Geodesic reports that the script has either completed or crashed.
         """
+        poller = zmq.Poller()
+        poller.register(self.rec, zmq.POLLIN)
         total = 0
         while True:
-            data = self.rec.recv_json()
-            total += 1
-            if 'done' in data:
-                self.mongo.finish_geodesic(self.geo_id, exception=True)
-                break
-            else:
-                self.mongo.push_geodesic(self.geo_id, data)
+            if poller.poll(self.time_to_flush()):
+                points = recv_points(self.rec)
+                total += len(points)
+                done = [p for p in points if 'done' in p]
+                for point in points:
+                    if 'checkpoint' in point:
+                        # The points before a checkpoint are stored first.
+                        self.flush()
+                        self.mongo.checkpoint_geodesic(self.geo_id, point)
+                    elif 'done' not in point:
+                        if len(self.buffer) == 0:
+                            self.buffer_start = time.time()
+                        self.buffer.append(point)
+                if len(done) > 0:
+                    self.flush()
+                    self.mongo.finish_geodesic(self.geo_id, exception=stopped_with_error(done[0]), data=done[0])
+                    break
+            if self.flush_due():
+                self.flush()
         self.rec.close()
 
+    def time_to_flush(self):
+        """
+        Returns
+        -------
+        timeout : ``int`` or ``None``
+            Milliseconds until the buffered points are too old, or None if
+            nothing is buffered.
+        """
+        if len(self.buffer) == 0:
+            return None
+        remaining = self.buffer_start + self.flush_interval - time.time()
+        return max(0, int(remaining * 1000))
+
+    def flush_due(self):
+        """
+        Returns
+        -------
+        ``bool``
+            True if the buffer is full or its oldest point is too old.
+        """
+        if len(self.buffer) == 0:
+            return False
+        return (len(self.buffer) >= self.flush_size or
+                time.time() - self.buffer_start >= self.flush_interval)
+
+    def flush(self):
+        """Writes all buffered points to MongoDB in one update.
+        """
+        self.mongo.push_geodesic_many(self.geo_id, self.buffer)
+        self.buffer = []
+        self.buffer_start = None
+
 
 if __name__ == "__main__":
     import sys
-    Collector(sys.argv[1])
+    if len(sys.argv) > 4:
+        Collector(sys.argv[1], int(sys.argv[2]), float(sys.argv[3]), sys.argv[4])
+    elif len(sys.argv) > 3:
+        Collector(sys.argv[1], int(sys.argv[2]), float(sys.argv[3]))
+    elif len(sys.argv) > 2:
+        Collector(sys.argv[1], int(sys.argv[2]))
+    else:
+        Collector(sys.argv[1])
@@ -0,0 +1,97 @@
+"""Command line tools for MBAM.
+
+    python -m mbam replay [geo_id ...] [--window 7] [--min-tau 0] [--margin 0] [--done | --not-done]
+    python -m mbam sysimage [--output PATH]
+    python -m mbam batch MODEL_DIR [--data DATA_DIR] [--processes N] [--summary PATH]
+"""
+import argparse
+import json
+import sys
+from .detection import STABLE_WINDOW
+
+
+def replay_command(args):
+    from .replay import replay
+    from .detection import StabilityPolicy
+    policy = StabilityPolicy(window=args.window, min_tau=args.min_tau, margin=args.margin)
+    results = replay(args.geo_ids or None, policy, args.processes, done=args.done)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    for result in results:
+        if result["stable"]:
+            print(result["geo_id"], "row", result["row"], "tau", result["tau"], result["limits"])
+        else:
+            print(result["geo_id"], "NO LIMIT", result["done"])
+    found = sum(1 for result in results if result["stable"])
+    print("LIMITS FOUND: {0}/{1}".format(found, len(results)))
+
+
+def sysimage_command(args):
+    from .sysimage import build_sysimage, default_sysimage_path
+    path = args.output if args.output else default_sysimage_path()
+    print("BUILDING SYSIMAGE", path)
+    try:
+        built = build_sysimage(path)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    if not built:
+        print("SYSIMAGE BUILD FAILED")
+        sys.exit(1)
+
+
+def batch_command(args):
+    from .batch import batch, find_jobs
+    jobs = find_jobs(args.model_dir, args.data)
+    if len(jobs) == 0:
+        print("NO MODELS FOUND IN", args.model_dir)
+        sys.exit(1)
+    summary = batch(jobs, args.processes)
+    with open(args.summary, "w") as f:
+        json.dump(summary, f, indent=2)
+    for model_path in summary["skipped"]:
+        print(model_path, "NO DATA")
+    failed = sum(1 for result in summary["results"] if result["error"])
+    print("MODELS RUN: {0}, FAILED: {1}, SECONDS: {2:.1f}".format(len(summary["results"]), failed,
+        summary["seconds"]))
+    print("SUMMARY SAVED TO", args.summary)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mbam")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    replay = commands.add_parser("replay", help="replay limit detection over stored geodesics")
+    replay.add_argument("geo_ids", nargs="*", help="geodesics to replay, defaults to every stored one")
+    replay.add_argument("--window", type=int, default=STABLE_WINDOW,
+        help="consecutive velocities that must infer the same limit")
+    replay.add_argument("--min-tau", type=float, default=0.0)
+    replay.add_argument("--margin", type=float, default=0.0)
+    replay.add_argument("--processes", type=int, default=None)
+    replay.add_argument("--json", help="file to save the results to")
+    done = replay.add_mutually_exclusive_group()
+    done.add_argument("--done", dest="done", action="store_const", const=True, default=None,
+        help="only the geodesics marked as done")
+    done.add_argument("--not-done", dest="done", action="store_const", const=False,
+        help="only the geodesics not marked as done, e.g. killed once their limit was stable")
+    replay.set_defaults(run=replay_command)
+
+    sysimage = commands.add_parser("sysimage", help="build a Julia system image for the geodesics")
+    sysimage.add_argument("--output", help="where to save it, defaults to julia_scripts/mbam_sysimage")
+    sysimage.set_defaults(run=sysimage_command)
+
+    batch = commands.add_parser("batch", help="reduce every model in a directory of model JSON files")
+    batch.add_argument("model_dir", help="directory of model JSON files")
+    batch.add_argument("--data", help="directory of the HDF5 data, <name>.h5 or <name>_*.h5, defaults to MODEL_DIR")
+    batch.add_argument("--processes", type=int, default=None, help="the most models reduced at once")
+    batch.add_argument("--summary", default="batch_summary.json", help="file to save the results and timings to")
+    batch.set_defaults(run=batch_command)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
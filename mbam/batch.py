@@ -0,0 +1,129 @@
+"""
+Reduces many models at once, one ``Engine.run`` per model, each in its own
+process.
+
+Models are read from a directory of model JSON files, like examples/models.
+The data of a model "<name>.json" is the HDF5 file "<name>.h5", or else the
+first "<name>_*.h5", in the data directory.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import traceback
+import glob
+import json
+import time
+import os
+
+
+def find_data(model_path, data_dir=None):
+    """
+    Parameters
+    ----------
+    model_path : ``str``
+        The path to the model JSON file.
+    data_dir : ``str``
+        The directory to look for the data in. Defaults to the directory of
+        the model.
+
+    Returns
+    -------
+    data_path : ``str``
+        The full path to the HDF5 data of the model, or None if there is none.
+    """
+    if data_dir is None:
+        data_dir = os.path.dirname(model_path)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    exact = os.path.join(data_dir, name + ".h5")
+    if os.path.exists(exact):
+        return os.path.abspath(exact)
+    matches = sorted(glob.glob(os.path.join(data_dir, glob.escape(name) + "_*.h5")))
+    return os.path.abspath(matches[0]) if matches else None
+
+
+def find_jobs(model_dir, data_dir=None):
+    """
+    Parameters
+    ----------
+    model_dir : ``str``
+        The directory of model JSON files.
+    data_dir : ``str``
+        The directory of the HDF5 data. Defaults to `model_dir`.
+
+    Returns
+    -------
+    jobs : ``list``
+        A (model_path, data_path) pair for each model, in name order. The
+        data path is None if no data was found.
+    """
+    model_paths = sorted(glob.glob(os.path.join(model_dir, "*.json")))
+    return [(os.path.abspath(path), find_data(path, data_dir)) for path in model_paths]
+
+
+def run_model(model_path, data_path):
+    """Reduces a single model of ``batch`` in a worker process.
+
+    Parameters
+    ----------
+    model_path : ``str``
+        The path to the model JSON file.
+    data_path : ``str``
+        The full path to the HDF5 data of the model.
+
+    Returns
+    -------
+    result : ``dict``
+        "model", "data", "model_id" (the starting model), "final_id" (the
+        last model reduced to), "reductions", "error" (the traceback if the
+        run crashed, or None) and "seconds".
+    """
+    from .engine import Engine
+    start = time.time()
+    result = {"model": model_path, "data": data_path, "model_id": None, "final_id": None,
+        "reductions": 0, "error": None}
+    try:
+        with open(model_path) as f:
+            model_dict = json.load(f)
+        engine = Engine(model_dict, data_path)
+        result["model_id"] = engine.model_id
+        result["reductions"] = engine.run()
+        result["final_id"] = engine.curr_id
+    except Exception:
+        result["error"] = traceback.format_exc()
+    result["seconds"] = time.time() - start
+    return result
+
+
+def batch(jobs, processes=None):
+    """Reduces many models in parallel.
+
+    Parameters
+    ----------
+    jobs : ``list``
+        A (model_path, data_path) pair for each model, see ``find_jobs``.
+        Models without data are skipped.
+    processes : ``int``
+        The most models reduced at once. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    summary : ``dict``
+        "results", the result of ``run_model`` for each model in the order
+        of `jobs`, "skipped", the models without data, and "seconds", the
+        time taken by the whole batch.
+    """
+    start = time.time()
+    skipped = [model_path for model_path, data_path in jobs if data_path is None]
+    jobs = [(model_path, data_path) for model_path, data_path in jobs if data_path is not None]
+    results = {}
+    if jobs:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = {pool.submit(run_model, *job): job[0] for job in jobs}
+            for future in as_completed(futures):
+                result = future.result()
+                print("DONE", os.path.basename(futures[future]), "REDUCTIONS", result["reductions"],
+                    "SECONDS", round(result["seconds"], 1), "FAIL" if result["error"] else "")
+                results[futures[future]] = result
+    return {
+        "results": [results[model_path] for model_path, _ in jobs],
+        "skipped": skipped,
+        "seconds": time.time() - start,
+        }
@@ -0,0 +1,214 @@
+"""
+Infers the limits a geodesic is approaching from its parameter velocities.
+
+A limit is inferred from a velocity when its largest magnitudes are separated
+from the rest by a gap above the threshold curve. The limit is considered
+stable once the same limit is inferred from enough consecutive velocities, as
+decided by a ``StabilityPolicy``.
+"""
+import numpy as np
+
+# The number of consecutive velocities that must infer the same limit by
+# default. The same 7 the original per-poll check required.
+STABLE_WINDOW = 7
+
+
+def find_threshold(n):
+    """The threshold set to determine what velocities are defined as approaching
+    a limit.
+
+    Parameters
+    ----------
+    n : ``int`` or ``numpy.ndarray``
+        The nth parameter being checked.
+    """
+    return .5*(1/np.sqrt(n) + 1/np.sqrt(n+1))
+
+
+class StabilityPolicy:
+    """Decides which velocities infer a limit and when a limit is stable.
+
+    Subclass and override `thresholds` or `stable` for other rules.
+    """
+    def __init__(self, window=STABLE_WINDOW, min_tau=0.0, margin=0.0):
+        """
+        Parameters
+        ----------
+        window : ``int``
+            The number of consecutive velocities that must infer the same
+            limit for it to be stable. Every velocity the geodesic sends is
+            checked, however many are sent per message.
+        min_tau : ``float``
+            The geodesic time the limit must be reached at or after to be
+            stable.
+        margin : ``float``
+            Added to the threshold curve, so a larger margin requires a
+            clearer gap between the velocities.
+        """
+        self.window = window
+        self.min_tau = min_tau
+        self.margin = margin
+
+    def thresholds(self, p):
+        """
+        Parameters
+        ----------
+        p : ``int``
+            The number of parameters.
+
+        Returns
+        -------
+        thresholds : ``numpy.ndarray``
+            The gap required after the nth largest magnitude for the n
+            largest to be a limit, for n in 1..p-1. With a single parameter,
+            the magnitude required for it to be a limit.
+        """
+        if p == 1:
+            return np.array([.9 + self.margin])
+        return find_threshold(np.arange(1, p)) + self.margin
+
+    def stable(self, runs, taus=None):
+        """
+        Parameters
+        ----------
+        runs : ``numpy.ndarray``
+            The number of consecutive velocities that inferred the same limit,
+            for each velocity a limit was inferred from.
+        taus : ``numpy.ndarray``
+            The geodesic time of each of those velocities, if known.
+
+        Returns
+        -------
+        stable : ``numpy.ndarray``
+            True for each velocity the limit is stable on.
+        """
+        stable = runs >= self.window
+        if taus is not None:
+            stable &= taus >= self.min_tau
+        elif self.min_tau > 0:
+            stable[:] = False
+        return stable
+
+
+class LimitDetector:
+    """Checks blocks of parameter velocities for limits in a single vectorized
+    pass, and counts how many consecutive velocities inferred the same limit.
+    """
+    # Codes used for each parameter of an inferred limit.
+    NONE, INF, ZERO = 0, 1, 2
+
+    def __init__(self, policy=None):
+        """
+        Parameters
+        ----------
+        policy : ``StabilityPolicy``
+            The rules for inferring and stabilizing limits. Defaults to
+            ``StabilityPolicy()``.
+        """
+        self.policy = policy if policy else StabilityPolicy()
+        self.thresholds = None
+        self.n_params = None
+        self.code = None
+        self.run = 0
+        self.rows = 0
+        self.stable_row = None
+
+    @property
+    def limits(self):
+        """``dict``: The last limit inferred, e.g. {"0": "inf", "2": "zero"},
+        or None if no limit has been inferred yet."""
+        if self.code is None:
+            return None
+        limits = {}
+        for j in np.flatnonzero(self.code):
+            limits[str(j)] = 'inf' if self.code[j] == self.INF else 'zero'
+        return limits
+
+    @property
+    def stable(self):
+        """``bool``: True if the policy found the limit to be stable."""
+        return self.stable_row is not None
+
+    def limit_codes(self, vs):
+        """Infers the limit from each velocity.
+
+        Parameters
+        ----------
+        vs : ``numpy.ndarray``
+            A 2-D array with one parameter velocity per row.
+
+        Returns
+        -------
+        found : ``numpy.ndarray``
+            True for each row a limit was inferred from.
+        codes : ``numpy.ndarray``
+            For each row, the code of every parameter in the inferred limit.
+        """
+        m, p = vs.shape
+        mags = np.abs(vs)
+        if self.n_params != p:
+            self.thresholds = self.policy.thresholds(p)
+            self.n_params = p
+        if p == 1:
+            n = np.where(mags[:, 0] > self.thresholds[0], 1, 0)
+        else:
+            # largest magnitude first
+            order = np.argsort(mags, axis=1)[:, ::-1]
+            ordered = np.take_along_axis(mags, order, axis=1)
+            gaps = ordered[:, :-1] - ordered[:, 1:] >= self.thresholds
+            n = np.where(gaps.any(axis=1), gaps.argmax(axis=1) + 1, 0)
+        in_limit = np.zeros((m, p), dtype=bool)
+        if p == 1:
+            in_limit[:, 0] = n == 1
+        else:
+            in_limit[np.arange(m)[:, None], order] = np.arange(p) < n[:, None]
+        codes = np.where(in_limit, np.where(vs > 0, self.INF, self.ZERO), self.NONE)
+        return n > 0, codes.astype(np.int8)
+
+    def update(self, vs, taus=None):
+        """Checks a block of velocities, stopping at the first one the limit
+        becomes stable on.
+
+        Parameters
+        ----------
+        vs : ``array_like``
+            The parameter velocities, one per row, in the order they were
+            computed.
+        taus : ``array_like``
+            The geodesic time of each velocity, if known.
+
+        Returns
+        -------
+        ``bool``
+            True if the limit is stable.
+        """
+        vs = np.asarray(vs, dtype=float)
+        # e.g. a message with only a checkpoint, or an empty buffer
+        if vs.size == 0 or self.stable:
+            return self.stable
+        if vs.ndim == 1:
+            vs = vs[None, :]
+        if taus is not None:
+            taus = np.asarray(taus, dtype=float).reshape(-1)
+        found, codes = self.limit_codes(vs)
+        rows = np.flatnonzero(found)
+        if len(rows) == 0:
+            self.rows += len(vs)
+            return False
+        codes = codes[rows]
+        same = np.empty(len(rows), dtype=bool)
+        same[0] = self.code is not None and np.array_equal(codes[0], self.code)
+        same[1:] = (codes[1:] == codes[:-1]).all(axis=1)
+        idx = np.arange(len(rows))
+        last_reset = np.maximum.accumulate(np.where(same, -1, idx))
+        runs = np.where(last_reset >= 0, idx - last_reset + 1, self.run + idx + 1)
+        hits = np.flatnonzero(self.policy.stable(runs, None if taus is None else taus[rows]))
+        end = hits[0] if len(hits) > 0 else len(rows) - 1
+        self.code = codes[end]
+        self.run = int(runs[end])
+        if len(hits) > 0:
+            self.stable_row = self.rows + int(rows[end])
+            self.rows = self.stable_row + 1
+        else:
+            self.rows += len(vs)
+        return self.stable
@@ -5,10 +5,71 @@ from .modeling import *
 from .iteration import Iteration
 from .parsing import *
 from .mongo import MMongo
+from .fingerprint import data_fingerprint
 from sympy import Symbol, latex, sympify
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import copy
 
 
+def model_from_dict(model_dict):
+    """Creates the model object used by the engine from a model dictionary.
+    ODE models are converted to DAE models.
+
+    Parameters
+    ----------
+    model_dict : ``dict``
+        A dictionary containing all the model information.
+
+    Returns
+    -------
+    model : ``DAE`` or ``Function``
+        The model object.
+    """
+    if model_dict['type'].lower() == 'ode':
+        return ODE(model_dict).to_dae()
+    elif model_dict['type'].lower() == 'dae':
+        return DAE(model_dict)
+    elif model_dict['type'].lower() == 'function':
+        return Function(model_dict)
+
+
+def explore_model(model_id, data_path, width):
+    """Reduces a single model of ``Engine.explore`` in a worker process.
+
+    Every distinct limit found by the geodesics is tried, most common first,
+    and every successful reparameterization is saved as a child of the
+    model, up to `width` children.
+
+    Parameters
+    ----------
+    model_id : ``str``
+        The id of the model to reduce.
+    data_path : ``str``
+        The full path to the hdf5 data file for the model.
+    width : ``int``
+        The most children saved for the model.
+
+    Returns
+    -------
+    model_ids : ``list``
+        The ids of the children saved.
+    """
+    model = model_from_dict(MMongo().load_model_id(model_id)["model"])
+    # Children of different parents can get the same name, see
+    # ``Base.update_name``. The model and geodesic scripts, and their Julia
+    # modules, are named after the model, so add its id while they run side
+    # by side. Saved children are still named off the base name.
+    model.name = "{0}_{1}".format(model.name, model_id)
+    iteration = Iteration(model, model_id, data_path, directions=max(1, (width + 1) // 2))
+    iteration.write_model_script(iteration.julia.options)  # create model.jl file
+    model_ids = []
+    for geo_id, limits in iteration.find_candidate_limits():
+        model_ids += iteration.save_all_reparams(limits, geo_id, width - len(model_ids))
+        if len(model_ids) >= width:
+            break
+    return model_ids
+
+
 class Engine:
     """
     Parameters
@@ -21,16 +82,63 @@ class Engine:
     def __init__(self, model_dict, data_path):
         self.data_path = data_path
         self.mongo = MMongo()
-        if model_dict['type'].lower() == 'ode':
-            self.model = ODE(model_dict)
-            self.model = self.model.to_dae()
-        elif model_dict['type'].lower() == 'dae':
-            self.model = DAE(model_dict)
+        self.mongo.create_indexes()
+        self.model = model_from_dict(model_dict)
         self.model_id = self.mongo.save_model(self.model)
         self.curr_model = self.model
         self.curr_id = self.model_id
 
-    
+    @classmethod
+    def from_model_id(cls, model_id, data_path):
+        """Continues the reduction of a saved model, e.g. after a crash,
+        instead of starting over.
+
+        Parameters
+        ----------
+        model_id : ``str``
+            The id of the starting model.
+        data_path : ``str``
+            The full path to the hdf5 data file for the model.
+
+        Returns
+        -------
+        engine : ``Engine``
+            The engine, with its current model the deepest model already
+            reduced from the starting model.
+        """
+        engine = cls.__new__(cls)
+        engine.data_path = data_path
+        engine.mongo = MMongo()
+        engine.mongo.create_indexes()
+        engine.model = model_from_dict(engine.mongo.load_model_id(model_id)["model"])
+        engine.model_id = str(model_id)
+        engine.curr_id = engine.deepest_descendant(engine.model_id)
+        engine.curr_model = model_from_dict(engine.mongo.load_model_id(engine.curr_id)["model"])
+        # New models are named off the starting model, as in a single run.
+        engine.curr_model.base_name = engine.model.base_name
+        if engine.curr_id != engine.model_id:
+            print("RESUMING FROM MODEL: ", engine.curr_id)
+        return engine
+
+    def deepest_descendant(self, model_id):
+        """
+        Parameters
+        ----------
+        model_id : ``str``
+            The id of the starting model.
+
+        Returns
+        -------
+        model_id : ``str``
+            The model reduced the most times from the starting model, through
+            the saved iterations. The first one saved if there are several.
+        """
+        level = [model_id]
+        while level:
+            deepest = level[0]
+            level = [child for parent in level for child in self.mongo.get_model_children(parent)]
+        return deepest
+
     def run(self, printing=False):
         """Runs the geodesic, infers the limit, attempts to evaluate the limit.
         Continues to repeat the process until a failure.
@@ -39,12 +147,26 @@ class Engine:
         ---------
         printing : ``bool``
             Prints out each new model in latex formating if True.
+
+        Returns
+        -------
+        reductions : ``int``
+            The number of successful iterations.
         """
+        reductions = 0
+        # The data does not change between the reductions.
+        data_hash = data_fingerprint(self.data_path)
         for i in range(len(self.curr_model.model_ps)):
-            self.curr_iter = Iteration(self.curr_model, self.curr_id, self.data_path)
+            # Models reduced side by side, e.g. by ``batch``, can have the
+            # same names, see ``explore_model``. Only the scripts get the id.
+            name = self.curr_model.name
+            self.curr_model.name = "{0}_{1}".format(name, self.curr_id)
+            self.curr_iter = Iteration(self.curr_model, self.curr_id, self.data_path, data_hash=data_hash)
+            self.curr_model.name = name
             self.curr_iter.write_model_script(self.curr_iter.julia.options)  # create model.jl file
             if self.curr_iter.auto_run():
                 print("PASS!")
+                reductions += 1
                 self.curr_model = self.curr_iter.N_minus_1
                 self.curr_id = self.curr_iter.N_minus_1_id
                 if printing:
@@ -52,6 +174,56 @@ class Engine:
             else:
                 print("FAIL on Model: ", self.curr_id)
                 break
+        return reductions
+
+    def explore(self, width=2, depth=None, processes=None):
+        """Explores the Hasse diagram breadth first instead of following a
+        single chain of reductions.
+
+        Each model is reduced in its own process, trying several limits and
+        several reparameterizations of each, and every successful one is
+        saved as a child with the usual iteration links. The children are
+        then reduced in turn.
+
+        Parameters
+        ----------
+        width : ``int``
+            The most children kept for each model.
+        depth : ``int``
+            The most reductions from the starting model. Defaults to the
+            number of parameters.
+        processes : ``int``
+            The number of models reduced at once. Defaults to the number of
+            CPUs.
+
+        Returns
+        -------
+        depths : ``dict``
+            Maps the id of each model explored to its number of reductions
+            from the starting model.
+        """
+        if depth is None:
+            depth = len(self.model.model_ps)
+        depths = {self.model_id: 0}
+        with ProcessPoolExecutor(processes) as pool:
+            running = {pool.submit(explore_model, self.model_id, self.data_path, width): self.model_id}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    model_id = running.pop(future)
+                    try:
+                        children = future.result()
+                    except Exception as e:
+                        print("FAIL on Model: ", model_id, e)
+                        continue
+                    if len(children) == 0:
+                        print("FAIL on Model: ", model_id)
+                    for child in children:
+                        print("PASS!", model_id, "->", child)
+                        depths[child] = depths[model_id] + 1
+                        if depths[child] < depth:
+                            running[pool.submit(explore_model, child, self.data_path, width)] = child
+        return depths
 
     def apply_limits(self, limit_list, printing=False):
         """Applies a list of given limits. No geodesic will be run.
@@ -0,0 +1,189 @@
+"""
+Canonical fingerprints of models, so a reduction already done along another
+path, or in an earlier run, can be reused instead of running the geodesic and
+the symbolic work again.
+
+Parameters and variables are renamed in the order they are declared, so two
+models that only differ in the names of their parameters and variables get
+the same fingerprint. Only renaming is recognized: declaring the same
+parameters in another order, or writing the same equations differently,
+gives another fingerprint. The reductions are stored in those canonical
+names, and renamed back to the names of the model they are reused for.
+"""
+import hashlib
+import json
+from sympy import Symbol, sympify
+
+CANONICAL_P = "mbamp{0}"
+CANONICAL_V = "mbamv{0}"
+# The new parameters of a reduced model, see ``child_names``.
+CANONICAL_T = "mbamt{0}"
+# How ``Reparam`` names new parameters after their combination.
+LABEL_SUBS = [("+", "_plus_"), ("-", "_minus_"), ("*", "_"), ("/", "_over_")]
+# The fields of a model dictionary that are not equations.
+MODEL_KEYS = ("type", "name", "class", "ps", "vs")
+
+
+def canonical_names(model):
+    """
+    Parameters
+    ----------
+    model : ``mbammodel``
+        Either Function, ODE, or DAE.
+
+    Returns
+    -------
+    names : ``dict``
+        Maps each parameter, variable and derivative name of the model to its
+        canonical name.
+    """
+    names = {}
+    for i, p in enumerate(model.model_ps.list):
+        names[p] = CANONICAL_P.format(i)
+    for i, v in enumerate(model.model_vs.list):
+        names[v] = CANONICAL_V.format(i)
+        names[v + "dot"] = CANONICAL_V.format(i) + "dot"
+    return names
+
+
+def child_names(names, model_dict, tildes):
+    """Extends renaming to a reduced model, which has the new parameters
+    found in its ftildes and, after a singular limit, variables named
+    "<var>tilde".
+
+    Parameters
+    ----------
+    names : ``dict``
+        Maps the names of the parent model to new names.
+    model_dict : ``dict``
+        The reduced model dictionary, in the names being renamed.
+    tildes : ``dict``
+        Maps the new parameters to new names.
+
+    Returns
+    -------
+    names : ``dict``
+        The extended mapping.
+    """
+    names = dict(names, **tildes)
+    for v in model_dict["vs"]:
+        name = v["name"]
+        if name not in names and name.endswith("tilde") and name[:-5] in names:
+            names[name] = names[name[:-5]] + "tilde"
+            names[name + "dot"] = names[name[:-5]] + "tildedot"
+    return names
+
+
+def parse_expr(expr, names):
+    """Parses an expression, keeping `names` as plain symbols even where
+    SymPy gives them a meaning, e.g. E, I, N, S, Q, beta or gamma.
+    """
+    return sympify(expr, locals={name: Symbol(name) for name in names})
+
+
+def tilde_label(f, names=()):
+    """Names a new parameter after its combination, e.g. "a/b" -> "a_over_b",
+    the way ``Reparam`` does. `names` are the symbols of the combination.
+    """
+    label = str(parse_expr(f, names)).replace(" ", "")
+    for rep in LABEL_SUBS:
+        label = label.replace(rep[0], rep[1])
+    return label
+
+
+def rename_expr(expr, names):
+    """Renames the symbols of an expression, e.g. "k_f*x_1" -> "mbamp0*mbamv0".
+
+    Parameters
+    ----------
+    expr : ``str``
+        The expression, or a substitution "a = b + c".
+    names : ``dict``
+        Maps old names to new names. Symbols not in it are kept.
+
+    Returns
+    -------
+    expr : ``str``
+        The renamed expression.
+    """
+    expr = str(expr)
+    if "=" in expr:
+        return " = ".join(rename_expr(side, names) for side in expr.split("="))
+    sym = parse_expr(expr, set(names) | set(names.values()))
+    subs = {s: Symbol(names[str(s)]) for s in sym.free_symbols if str(s) in names}
+    return str(sym.xreplace(subs))
+
+
+def rename_model_dict(model_dict, names):
+    """Renames the parameters, variables and equations of a model dictionary.
+
+    Parameters
+    ----------
+    model_dict : ``dict``
+        A model dictionary, as returned by ``str_dict``.
+    names : ``dict``
+        Maps old names to new names.
+
+    Returns
+    -------
+    model_dict : ``dict``
+        A renamed copy of the model dictionary.
+    """
+    renamed = {key: val for key, val in model_dict.items() if key in MODEL_KEYS}
+    renamed["ps"] = [dict(p, name=names.get(p["name"], p["name"])) for p in model_dict["ps"]]
+    renamed["vs"] = [dict(v, name=names.get(v["name"], v["name"])) for v in model_dict["vs"]]
+    for key, val in model_dict.items():
+        if key not in MODEL_KEYS and isinstance(val, dict) and "eqs" in val:
+            renamed[key] = {
+                "sbs": [rename_expr(sb, names) for sb in val["sbs"]],
+                "eqs": [rename_expr(eq, names) for eq in val["eqs"]],
+            }
+    return renamed
+
+
+def rename_ftildes(ftildes, names):
+    """Renames the symbols of a list of ftildes of strings. The limits are kept.
+    """
+    return [{key: val if key == "limit" else rename_expr(val, names) for key, val in f.items()}
+        for f in ftildes]
+
+
+def data_fingerprint(data_path):
+    """
+    Parameters
+    ----------
+    data_path : ``str``
+        The path to the hdf5 data file.
+
+    Returns
+    -------
+    fingerprint : ``str``
+        A hash of the contents of the file, so a reduction is not reused
+        once the data at the same path changes.
+    """
+    sha = hashlib.sha256()
+    with open(data_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def fingerprint(model):
+    """
+    Parameters
+    ----------
+    model : ``mbammodel``
+        Either Function, ODE, or DAE.
+
+    Returns
+    -------
+    fingerprint : ``str``
+        A hash of the equations, parameter transforms and initial values, and
+        variable types of the model, with its parameters and variables renamed
+        canonically. The initial values are where the geodesic starts.
+    """
+    canonical = rename_model_dict(model.str_dict, canonical_names(model))
+    # The name does not change the model.
+    canonical.pop("name")
+    text = json.dumps(canonical, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -3,58 +3,318 @@ A manager module for running and reporting on the geodesic.
 """
 
 import subprocess
+import threading
+import queue
 import time
 import sys
 import os
-import numpy as np
-from .mongo import MMongo
+import socket
+import tempfile
+import zmq
+from .mongo import MMongo, stopped_with_error
+from .wire import recv_points
+from .trajectory import TrajectoryBuffer, COLUMNS
+from .detection import LimitDetector, find_threshold
+from .sysimage import julia_command
+
+
+def free_endpoint():
+    """
+    Returns
+    -------
+    endpoint : ``str``
+        A local TCP address on a port that is currently free, so several
+        geodesics can run at once.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return "tcp://127.0.0.1:{0}".format(s.getsockname()[1])
+
+
+def geo_endpoint(geo_id):
+    """
+    Parameters
+    ----------
+    geo_id : ``str``
+        The ID of the geodesic.
+
+    Returns
+    -------
+    endpoint : ``str``
+        The ZMQ address the geodesic sends its data to. An IPC path named
+        after the geodesic, so concurrent geodesics never share an address,
+        or a free local port where IPC is not available.
+    """
+    if sys.platform.startswith("win"):
+        return free_endpoint()
+    return "ipc://" + os.path.join(tempfile.gettempdir(), "mbam-geo-{0}.ipc".format(geo_id))
+
 
 class Geodesic:
-    def __init__(self, geo_parser, sender_file_path):
+    def __init__(self, geo_parser, sender_file_path, flush_size=50, flush_interval=.2, store="chunks",
+            policy=None, endpoint=None, direction=0, sign=1, worker=None, collector="thread", geo_id=None):
         """
         Parameters
         ----------
         geo_parser : ``parsing.geo``
             The parser object for the geodesic.
         sender_file_path : ``str``
-            Path to the juliatomongo.py script. Run to connect to the Julia script
-            and forward the data to MongoDB.
+            Path to the juliatomongo.py script. Only run when the data
+            collector is a subprocess, to connect to the Julia script and
+            forward the data to MongoDB.
+        flush_size : ``int``
+            The most geodesic points written to MongoDB in a single update.
+        flush_interval : ``float``
+            The longest time in seconds the juliatomongo.py collector buffers a
+            point before writing it.
+        store : ``str``
+            Where the points are stored: "chunks" for MongoDB documents, or
+            "files" for append-only files under TRAJECTORY_DIR that can be
+            memory-mapped.
+        policy : ``StabilityPolicy``
+            The rules deciding when a limit is stable. The geodesic is killed
+            as soon as they are met. Defaults to ``StabilityPolicy()``.
+        endpoint : ``str``
+            The ZMQ address the Julia geodesic pushes its data to. Defaults
+            to an address of its own, see ``geo_endpoint``.
+        direction : ``int``
+            The initial direction of the geodesic: 0 for the sloppiest
+            direction, k for the k-th next sloppiest singular vector of the
+            Jacobian. Must be less than the number of parameters.
+        sign : ``int``
+            1 or -1, the sign of the initial velocity.
+        worker : ``JuliaWorker``
+            The long-lived Julia process to run the geodesic script in. By
+            default, a new Julia process is started for the geodesic.
+        collector : ``str``
+            "thread" to collect the data with a ``GeodesicConsumer`` thread in
+            this process, or "subprocess" to start juliatomongo.py and watch
+            MongoDB for the data it forwards.
+        geo_id : ``str``
+            The ID of a stored geodesic to continue with ``resume``. By
+            default, a new geodesic is created.
         """
+        # The script indexes the singular vectors of the Jacobian by the
+        # direction, which Julia would only report once the geodesic runs.
+        n_params = len(geo_parser.mm.model_ps)
+        if not 0 <= direction < n_params:
+            raise RuntimeError("No direction %d for a model with %d parameters" %(direction, n_params))
+        self.geo_parser = geo_parser
         self.path = geo_parser.file_path
         self.data_sender = sender_file_path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.direction = direction
+        self.sign = sign
+        self.worker = worker
+        self.collector = collector
+        self.push = collector == "thread"
         self.mongo = MMongo()
-        self.limit_seq = []
-        self.geo_id = self.mongo.init_geodesic()
+        self.detector = LimitDetector(policy)
+        self.kill_lock = threading.Lock()
+        self.killed = False
+        self.n_read = 0
+        self.buffer = TrajectoryBuffer()
+        self.limits = []
+        # Why the Julia geodesic stopped, once it has, e.g. "max_steps".
+        self.reason = None
+        self.finished = threading.Event()
+        self.consumer = None
+        self.geo_run = None
+        self.data_collect_run = None
+        self.geo_id = geo_id if geo_id else self.mongo.init_geodesic(store)
+        self.endpoint = endpoint if endpoint else geo_endpoint(self.geo_id)
 
-    def run_geo_auto(self):
+    def run_geo_auto(self, push=None):
         """Runs the geodesic until manually killed, or until the limits are found.
 
+        Parameters
+        ----------
+        push : ``bool``
+            If True, the geodesic data is consumed in-process as it arrives.
+            Otherwise the data collector subprocess forwards it to MongoDB
+            and the database is watched for new data. Defaults to the
+            `collector` the geodesic was created with.
+
+        Returns
+        -------
+        limits : ``dict``
+            A dictionary of limits. e.g. {"p1": "inf", "p2", "zero"}
+        """
+        try:
+            self.start(push=push)
+        except Exception:
+            self.kill()
+            raise
+        return self.wait(push)
+
+    def wait(self, push=None):
+        """Waits for the limits of the started geodesic, then kills it.
+
+        Parameters
+        ----------
+        push : ``bool``
+            Must match the value the geodesic was started with, which is the
+            default.
+
         Returns
         -------
         limits : ``dict``
             A dictionary of limits. e.g. {"p1": "inf", "p2", "zero"}
         """
-        self.start()
+        if push is None:
+            push = self.push
         self.limits = []
         try:
-            while len(self.limits) == 0:
-                self.limits = self.check_engine_geo(self.mongo.query_geodesic(self.geo_id))
-                time.sleep(.4)
+            if push:
+                self.wait_for_limits()
+            else:
+                self.watch_for_limits()
         finally:
             self.kill()
         return self.limits
 
+    def resume(self, push=None):
+        """Restarts a killed or crashed geodesic from its last checkpoint,
+        instead of integrating again from the initial parameters. To resume
+        a geodesic started by another process, create the ``Geodesic`` with
+        its `geo_id`.
+
+        The points stored after the checkpoint are dropped, and the points
+        kept are checked for limits before the geodesic is restarted.
+
+        Parameters
+        ----------
+        push : ``bool``
+            Passed on to ``run_geo_auto``.
+
+        Returns
+        -------
+        limits : ``dict``
+            A dictionary of limits. e.g. {"p1": "inf", "p2", "zero"}
+        """
+        checkpoint = self.mongo.rewind_geodesic(self.geo_id)
+        if checkpoint is None:
+            print("NO CHECKPOINT, RESTARTING GEODESIC FROM THE START")
+        self.detector = LimitDetector(self.detector.policy)
+        self.buffer = TrajectoryBuffer()
+        self.n_read = 0
+        self.reason = None
+        self.killed = False
+        self.finished.clear()
+        self.consumer = None
+        self.geo_run = None
+        self.data_collect_run = None
+        geo_data = self.mongo.query_geodesic_range(self.geo_id, 0, checkpoint["n"] if checkpoint else 0)
+        self.read_rows(geo_data)
+        if len(geo_data["v"]) > 0 and self.detector.update(geo_data["v"], geo_data["tau"]):
+            self.limits = self.detector.limits
+            return self.limits
+        path = self.path
+        self.path = self.geo_parser.resume_script(checkpoint, self.geo_id)
+        try:
+            return self.run_geo_auto(push)
+        finally:
+            self.path = path
+
+    def wait_for_limits(self):
+        """Blocks until the consumer reports limits or the end of the geodesic.
+
+        Wakes up periodically only to make sure the Julia process is still
+        alive, in case it died without reporting that it was done.
+        """
+        while not self.finished.wait(1.0):
+            if self.geo_run.poll() is not None and not self.finished.wait(1.0):
+                print("GEODESIC PROCESS EXITED")
+                self.limits = ["EMPTY"]
+                break
+
+    def watch_for_limits(self):
+        """Checks the new rows stored in MongoDB until limits are found or the
+        geodesic is done.
+
+        Waits on a change stream between checks, so new rows are checked as
+        soon as they are stored. Falls back to checking every .4 seconds when
+        change streams are not available.
+        """
+        stream = self.mongo.watch_geodesic(self.geo_id)
+        try:
+            exited = False
+            while True:
+                self.limits = self.check_engine_geo_since(self.mongo.query_geodesic_since(self.geo_id, self.n_read))
+                if len(self.limits) > 0:
+                    break
+                if exited:
+                    print("GEODESIC PROCESS EXITED")
+                    self.limits = ["EMPTY"]
+                    break
+                # Give the collector one more round to report the end.
+                exited = self.geo_run.poll() is not None
+                if stream:
+                    stream.try_next()
+                else:
+                    time.sleep(.4)
+        finally:
+            if stream:
+                stream.close()
+
+    def consume(self, geo_data):
+        """Checks geodesic rows pushed by the consumer for limits, and wakes up
+        ``run_geo_auto`` once the limits are found or the geodesic is done.
+
+        Parameters
+        ----------
+        geo_data : ``dict``
+            The new rows of the geodesic, in the same format returned by
+            ``MMongo.query_geodesic_since``.
+        """
+        limits = self.check_engine_geo_since(geo_data)
+        if len(limits) > 0:
+            self.limits = limits
+            self.finished.set()
+
     def kill(self):
         """Kills the subprocesses used to run the geodesic and the data collector.
+        Safe to call more than once, and from the consumer thread.
         """
-        self.data_collect_run.kill()
-        self.geo_run.kill()
+        with self.kill_lock:
+            if self.killed:
+                return
+            geo_run = self.geo_run
+            # Before the Julia geodesic is started there is nothing to kill
+            # yet, so a later call must still kill it.
+            if geo_run:
+                self.killed = True
+        if geo_run:
+            geo_run.kill()
+        if self.consumer:
+            self.consumer.stop()
+        elif self.data_collect_run:
+            self.data_collect_run.kill()
+
+    def start(self, push=None):
+        """Starts the Julia geodesic and the data collector.
 
-    def start(self):
-        """Starts both subprocesses: the Julia geodesic and data collector.
+        Parameters
+        ----------
+        push : ``bool``
+            If True, the data is collected by a ``GeodesicConsumer`` thread in
+            this process. Otherwise the data collector subprocess is started.
+            Defaults to the `collector` the geodesic was created with.
         """
-        self.data_collect_run = subprocess.Popen([sys.executable, self.data_sender, str(self.geo_id)])
-        self.geo_run = subprocess.Popen(['julia', self.path])
+        if push is not None:
+            self.push = push
+        if self.push:
+            self.consumer = GeodesicConsumer(self, self.endpoint)
+            self.consumer.start()
+        else:
+            self.data_collect_run = subprocess.Popen([sys.executable, self.data_sender, str(self.geo_id),
+                str(self.flush_size), str(self.flush_interval), self.endpoint])
+        args = [self.endpoint, str(self.direction), str(self.sign)]
+        if self.worker:
+            self.geo_run = self.worker.run(self.path, args)
+        else:
+            self.geo_run = subprocess.Popen(julia_command() + [self.path] + args)
 
     # def check_geo(self):
     #     """Queries the geodesic
@@ -63,42 +323,72 @@ class Geodesic:
         # data = self.mongo.query_geodesic(self.geo_id)
 
     def curr_data(self):
-        """Queries the geodesic from the database and checks potential limits
+        """Queries the new geodesic rows from the database and checks potential
+        limits. Rows pushed by an in-process consumer are already buffered.
 
         Returns
         -------
         ``dict``
             Contains geodesic data and any inferred limits.
         """
-        data = self.mongo.query_geodesic(self.geo_id)
-        data["x"] = np.array(data["x"]).transpose().tolist()
+        done = None
+        if not self.consumer:
+            geo_data = self.mongo.query_geodesic_since(self.geo_id, self.n_read)
+            self.read_rows(geo_data)
+            if len(geo_data["v"]) > 0:
+                self.detector.update(geo_data["v"], geo_data["tau"])
+            done = geo_data.get("done")
+            self.reason = geo_data.get("reason")
+        elif self.finished.is_set():
+            done = "done"
+        data = {
+            "x": self.buffer.view("x").transpose().tolist(),
+            "v": self.buffer.view("v").tolist(),
+            "t": self.buffer.view("t").tolist(),
+            "tau": self.buffer.view("tau").tolist(),
+        }
+        if done:
+            data["done"] = done
+            data["reason"] = self.reason
         return self.update_limits(data)
 
+    def read_rows(self, geo_data):
+        """Adds new geodesic rows to the trajectory buffer.
+
+        Parameters
+        ----------
+        geo_data : ``dict``
+            The new rows of "x", "v", "t" and "tau".
+        """
+        self.buffer.append(geo_data)
+        self.n_read += len(geo_data["v"])
+
     def update_limits(self, geo_data):
         """Checks the current data for any potential limits used for UI.
 
         Parameters
         ----------
         geo_data : ``dict``
-            The dictionary of geodesic data.
+            The dictionary of geodesic data. Its new velocities must already
+            have been checked by the limit detector.
 
         Returns
         -------
         ``dict``
             The geodesic data and any limits inferred.
         """
-        if "done" in geo_data and len(self.limit_seq) == 0:
+        limits = self.detector.limits
+        if "done" in geo_data and limits is None:
             print("BAD CRASH")
             geo_data['limits'] = {}
             geo_data['type'] = "geo-done"
-        elif "done" in geo_data and len(self.limit_seq) > 0:
+        elif "done" in geo_data and limits is not None:
             # print("BAD CRASH")
-            geo_data['limits'] = self.limit_seq[-1]
+            geo_data['limits'] = limits
             geo_data['type'] = "geo-done"
         elif len(geo_data["v"]) > 0:
-            self.check_limits(geo_data["v"][-1])
-            if len(self.limit_seq) > 6:
-                geo_data['limits'] = self.limit_seq[-1]
+            if self.detector.stable:
+                geo_data['limits'] = limits
                 geo_data['type'] = "geo-done"
             else:
                 geo_data['type'] = "geo"
@@ -108,55 +398,59 @@ class Geodesic:
         """Checks the current data for any potential limits used for engine.
         """
         # engine geo cuts off automatically
-        geo_data["x"] = np.array(geo_data["x"]).transpose().tolist()
-        if "done" in geo_data and len(self.limit_seq) == 0:
+        if "done" in geo_data and self.detector.limits is None:
             print("NO LIMIT REACHED IN GEODESIC")
             # Delete Failed Geodesic from database?
             return ["EMPTY"]
-        elif "done" in geo_data and len(self.limit_seq) > 0:
-            return self.limit_seq[-1]
+        elif "done" in geo_data and self.detector.limits is not None:
+            return self.detector.limits
         elif len(geo_data["v"]) > 0:
-            self.check_limits(geo_data["v"][-1])
-            if len(self.limit_seq) > 6:
-                return self.limit_seq[-1]
+            if self.detector.update(geo_data["v"][-1], geo_data["tau"][-1:]):
+                return self.detector.limits
         return []
 
-    def check_limits(self, recent_vs):
+    def check_engine_geo_since(self, geo_data):
+        """Checks only the geodesic rows added since the last call for
+        potential limits used for engine.
+
+        Parameters
+        ----------
+        geo_data : ``dict``
+            The rows queried with ``MMongo.query_geodesic_since``.
+
+        Returns
+        -------
+        limits : ``dict`` or ``list``
+            The stable limits if found, ["EMPTY"] if the geodesic finished
+            without a limit, otherwise an empty list.
+        """
+        self.read_rows(geo_data)
+        # A message can carry only a checkpoint or the end of the geodesic.
+        if len(geo_data["v"]) > 0 and self.detector.update(geo_data["v"], geo_data["tau"]):
+            # No need to keep integrating once the policy is met.
+            self.kill()
+            return self.detector.limits
+        if "done" in geo_data:
+            self.reason = geo_data.get("reason")
+            print("GEODESIC STOPPED: ", self.reason)
+        if "done" in geo_data and self.detector.limits is None:
+            print("NO LIMIT REACHED IN GEODESIC")
+            return ["EMPTY"]
+        elif "done" in geo_data and self.detector.limits is not None:
+            return self.detector.limits
+        return []
+
+    def check_limits(self, recent_vs, tau=None):
         """Checks parameter velocities for any potential limits.
 
         Parameters
         ----------
         recent_vs : ``list``
             A list of the most recent parameter velocities.
+        tau : ``float``
+            The geodesic time of the velocities.
         """
-        limits = {}
-        correctDir = 1
-        vs = np.array(recent_vs)
-        n = -1
-        arglist = list(np.argsort(np.abs(vs)))
-        arglist.reverse()
-        if len(arglist) == 1:
-            if np.abs(vs[arglist[0]]) > .9:
-                n = 1
-        else:
-            for i, item in enumerate(arglist):
-                if i != len(arglist) - 1:
-                    if np.abs(vs[arglist[i]]) - np.abs(vs[arglist[i+1]]) >= self.find_threshold(i+1):
-                        n = i+1
-                        break
-        if n != -1:
-            for j in arglist[:n]:
-                if vs[j] > 0:
-                    limits[str(j)] = 'inf'
-                else:
-                    limits[str(j)] = 'zero'
-
-            if len(self.limit_seq) == 0:
-                self.limit_seq.append(limits)
-            elif self.limit_seq[-1] == limits:
-                self.limit_seq.append(limits)
-            else:
-                self.limit_seq = [limits]
+        self.detector.update(recent_vs, None if tau is None else [tau])
 
     def find_threshold(self, n):
         """The threshold set to determine what velocities are defined as approaching
@@ -167,4 +461,248 @@ class Geodesic:
         n : ``int``
             The nth parameter being checked.
         """
-        return .5*(1/np.sqrt(n) + 1/np.sqrt(n+1))
+        return find_threshold(n)
+
+
+class GeodesicWriter(threading.Thread):
+    """Persists the geodesic data handed over by a ``GeodesicConsumer`` to
+    MongoDB, so database round trips never delay limit detection.
+
+    Every point queued while the previous update was running is written in
+    the next update, up to `flush_size` points at a time.
+    """
+    def __init__(self, mongo, geo_id, flush_size=50):
+        """
+        Parameters
+        ----------
+        mongo : ``MMongo``
+            The database client used to store the geodesic.
+        geo_id : ``str``
+            The ID of the geodesic to add the data to.
+        flush_size : ``int``
+            The most points written in a single update.
+        """
+        super().__init__(daemon=True)
+        self.mongo = mongo
+        self.geo_id = geo_id
+        self.flush_size = flush_size
+        self.queue = queue.Queue()
+
+    def put(self, data):
+        """Queues data received from the Julia geodesic to be saved.
+
+        Parameters
+        ----------
+        data : ``dict``
+            A single geodesic point, a checkpoint or the 'done' message.
+            ``None`` stops the writer once everything queued before it has
+            been saved.
+        """
+        self.queue.put(data)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.flush_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            points = []
+            for data in batch:
+                if data is not None and 'checkpoint' in data:
+                    self.mongo.push_geodesic_many(self.geo_id, points)
+                    self.mongo.checkpoint_geodesic(self.geo_id, data)
+                    points = []
+                    continue
+                if data is None or 'done' in data:
+                    self.mongo.push_geodesic_many(self.geo_id, points)
+                    if data is not None:
+                        self.mongo.finish_geodesic(self.geo_id, exception=stopped_with_error(data), data=data)
+                    return
+                points.append(data)
+            self.mongo.push_geodesic_many(self.geo_id, points)
+
+
+class GeodesicConsumer(threading.Thread):
+    """Pulls the data straight from the Julia geodesic over ZMQ, feeds each
+    new velocity into the limit detection of its ``Geodesic`` and hands the
+    data to a ``GeodesicWriter`` to be saved.
+
+    Replaces the route through the juliatomongo.py subprocess and MongoDB
+    polling, so limits are detected as fast as the integrator steps.
+    """
+    def __init__(self, geodesic, endpoint=None):
+        """
+        Parameters
+        ----------
+        geodesic : ``Geodesic``
+            The geodesic checked for limits as its data arrives.
+        endpoint : ``str``
+            The ZMQ address the Julia geodesic pushes its data to. Defaults
+            to the endpoint of the geodesic.
+        """
+        super().__init__(daemon=True)
+        self.geodesic = geodesic
+        self.writer = GeodesicWriter(geodesic.mongo, geodesic.geo_id, geodesic.flush_size)
+        self.stopped = threading.Event()
+        # Bind before the Julia script starts, so errors show up in the caller.
+        self.rec = zmq.Context.instance().socket(zmq.PULL)
+        self.rec.bind(endpoint if endpoint else geodesic.endpoint)
+
+    def stop(self):
+        """Stops consuming data. Data already received is still saved.
+        """
+        self.stopped.set()
+
+    def run(self):
+        self.writer.start()
+        poller = zmq.Poller()
+        poller.register(self.rec, zmq.POLLIN)
+        try:
+            while not self.stopped.is_set():
+                if not poller.poll(100):
+                    continue
+                points = recv_points(self.rec)
+                geo_data = {key: [] for key in COLUMNS}
+                for data in points:
+                    self.writer.put(data)
+                    if 'checkpoint' in data:
+                        continue
+                    if 'done' in data:
+                        geo_data['done'] = data['done']
+                        geo_data['reason'] = data.get('reason')
+                    else:
+                        geo_data["x"].append(data["x"])
+                        geo_data["v"].append(data["v"])
+                        geo_data["t"].append(data["t"][0])
+                        geo_data["tau"].append(data["tau"][0])
+                self.geodesic.consume(geo_data)
+                if 'done' in geo_data:
+                    break
+        finally:
+            self.rec.close()
+            self.writer.put(None)
+
+
+class GeodesicEnsemble:
+    """Runs geodesics in several initial directions at once and keeps the
+    first limit enough of them agree on.
+
+    Both signs of the `directions` sloppiest directions are run, each on
+    its own endpoint, so a geodesic heading into a dead end does not hold up
+    the iteration. The other geodesics are killed as soon as the limit is
+    agreed on.
+    """
+    def __init__(self, geo_parser, sender_file_path, directions=1, agree=1, fallback=False, **kwargs):
+        """
+        Parameters
+        ----------
+        geo_parser : ``parsing.geo``
+            The parser object for the geodesics.
+        sender_file_path : ``str``
+            Path to the juliatomongo.py script.
+        directions : ``int``
+            The number of sloppiest directions to run the geodesics in, at
+            most the number of parameters.
+        agree : ``int``
+            The number of geodesics that must find the same limit.
+        fallback : ``bool``
+            If True and no limit is agreed on, ``run_geo_auto`` returns the
+            limits found by the most geodesics instead of ["EMPTY"].
+        **kwargs
+            Passed on to each ``Geodesic``.
+        """
+        n_params = len(geo_parser.mm.model_ps)
+        if directions > n_params:
+            raise RuntimeError("Cannot run geodesics in %d directions of a model with %d parameters"
+                %(directions, n_params))
+        self.agree = agree
+        self.fallback = fallback
+        self.geodesics = []
+        for direction in range(directions):
+            for sign in (1, -1):
+                self.geodesics.append(Geodesic(geo_parser, sender_file_path, direction=direction, sign=sign,
+                    **kwargs))
+        # The geodesic the limits were taken from.
+        self.geo_id = self.geodesics[0].geo_id
+        self.limits = []
+
+    def run_geo_auto(self, push=None):
+        """Runs every geodesic until enough of them agree on a limit, or until
+        they all finish.
+
+        Parameters
+        ----------
+        push : ``bool``
+            Passed on to ``Geodesic.run_geo_auto``.
+
+        Returns
+        -------
+        limits : ``dict``
+            The limits agreed on, or ["EMPTY"] if no limit was agreed on. See
+            `fallback`.
+        """
+        found = self.run(push, self.agree)
+        geodesics = max(found.values(), key=len) if found else []
+        if len(geodesics) == 0 or (len(geodesics) < self.agree and not self.fallback):
+            self.limits = ["EMPTY"]
+            return self.limits
+        self.geo_id = geodesics[0].geo_id
+        self.limits = geodesics[0].limits
+        return self.limits
+
+    def all_limits(self, push=None):
+        """Runs every geodesic until it finds a limit or finishes.
+
+        Parameters
+        ----------
+        push : ``bool``
+            Passed on to ``Geodesic.run_geo_auto``.
+
+        Returns
+        -------
+        candidates : ``list``
+            A (geo_id, limits) pair for each distinct limit found, with the
+            limits found by the most geodesics first.
+        """
+        found = self.run(push)
+        ordered = sorted(found.values(), key=len, reverse=True)
+        return [(geodesics[0].geo_id, geodesics[0].limits) for geodesics in ordered]
+
+    def run(self, push=None, agree=None):
+        """Runs the geodesics until `agree` of them find the same limit, or
+        until they all finish. The rest are then killed.
+
+        Returns
+        -------
+        found : ``dict``
+            The geodesics that found each distinct limit, in the order the
+            limits were first found.
+        """
+        results = queue.Queue()
+        found = {}
+        try:
+            # Started inside the try, so the geodesics already started are
+            # killed if another one fails to start.
+            for geodesic in self.geodesics:
+                geodesic.start(push)
+            for geodesic in self.geodesics:
+                threading.Thread(target=lambda g=geodesic: results.put((g, g.wait(push))), daemon=True).start()
+            for _ in self.geodesics:
+                geodesic, limits = results.get()
+                if not isinstance(limits, dict):
+                    continue
+                key = tuple(sorted(limits.items()))
+                found.setdefault(key, []).append(geodesic)
+                if agree is not None and len(found[key]) >= agree:
+                    break
+        finally:
+            self.kill()
+        return found
+
+    def kill(self):
+        """Kills every geodesic of the ensemble.
+        """
+        for geodesic in self.geodesics:
+            geodesic.kill()
@@ -8,7 +8,9 @@ from .modeling import *
 from .parsing import *
 from .mongo import MMongo
 from .limits import *
-from .geodesic import Geodesic
+from .geodesic import Geodesic, GeodesicEnsemble
+from .fingerprint import (fingerprint, data_fingerprint, canonical_names, child_names, tilde_label,
+    parse_expr, rename_ftildes, rename_model_dict, CANONICAL_T)
 # from singular_limit import SingularLimit
 from copy import deepcopy
 # from reparameterize import Reparams
@@ -17,7 +19,8 @@ import os
 import logging
 
 class Iteration:
-    def __init__(self, model, model_id, data_path):
+    def __init__(self, model, model_id, data_path, policy=None, directions=0, agree=1, worker=None,
+            pool=None, data_hash=None):
         """
         Parameters
         ----------
@@ -27,6 +30,21 @@ class Iteration:
             The id of the model with N parameters.
         data_path : ``str``
             The full path to the hdf5 data file for the model.
+        policy : ``StabilityPolicy``
+            The rules deciding when a limit found by the geodesic is stable.
+        directions : ``int``
+            If above 0, ``find_limits`` runs geodesics in both signs of this
+            many sloppiest directions at once, see ``GeodesicEnsemble``.
+        agree : ``int``
+            The number of those geodesics that must find the same limit.
+        worker : ``JuliaWorker``
+            The long-lived Julia process to run the geodesic in, instead of
+            starting Julia for it.
+        pool : ``WorkerPool``
+            The pool of Julia workers shared with other iterations. If given,
+            ``find_limits`` queues the geodesic there.
+        data_hash : ``str``
+            The ``data_fingerprint`` of the data file, if already known.
         """
         self.logger = logging.getLogger("MBAM.Iteration")
         self.logger.debug("Initializing Iteration")
@@ -34,6 +52,13 @@ class Iteration:
         self.N_id = str(model_id)
         self.mongo = MMongo()
         self.data_path = data_path
+        self._data_hash = data_hash
+        self.policy = policy
+        self.directions = directions
+        self.agree = agree
+        self.worker = worker
+        self.pool = pool
+        self.task = None
         self.N_minus_1 = None
         self.N_minus_1_id = None
         self.ftildes = None
@@ -48,20 +73,45 @@ class Iteration:
     def init_geodesic(self):
         """Creates the Geodesic object, and retrieves its id.
         """
-        self.geodesic = Geodesic(self.geo_parser, os.path.join(os.getcwd(), 'juliatomongo.py'))
+        self.geodesic = Geodesic(self.geo_parser, os.path.join(os.getcwd(), 'juliatomongo.py'), policy=self.policy,
+            worker=self.worker)
+        self.geo_id = self.geodesic.geo_id
+
+    def init_ensemble(self):
+        """Creates the GeodesicEnsemble object used in place of a single
+        geodesic.
+        """
+        self.geodesic = GeodesicEnsemble(self.geo_parser, os.path.join(os.getcwd(), 'juliatomongo.py'),
+            max(1, self.directions), self.agree, policy=self.policy)
         self.geo_id = self.geodesic.geo_id
 
     def find_limits(self):
         """Starts the geodesic and runs until a limit is found, or until the
         geodesic crashes.
         """
-        self.init_geodesic()
-        return self.limit_keys_to_ps(self.geodesic.run_geo_auto())
+        if self.pool:
+            # Geodesics of other iterations run alongside on the pool.
+            self.geodesic = Geodesic(self.geo_parser, os.path.join(os.getcwd(), 'juliatomongo.py'),
+                policy=self.policy)
+            self.task = self.pool.submit(self.geodesic, owner=self.N_id)
+            limits = self.task.result()
+        elif self.directions > 0:
+            self.init_ensemble()
+            limits = self.geodesic.run_geo_auto()
+        else:
+            self.init_geodesic()
+            limits = self.geodesic.run_geo_auto()
+        # An ensemble reports the geodesic its limits came from.
+        self.geo_id = self.geodesic.geo_id
+        return self.limit_keys_to_ps(limits)
 
     def kill_geodesic(self):
         """Kills the geodesic subprocess.
         """
-        self.geodesic.kill()
+        if self.task:
+            self.pool.cancel(self.task)
+        else:
+            self.geodesic.kill()
 
     def limit_keys_to_ps(self, limits):
         """Converts what the geodesic returns to a more useable format.
@@ -129,7 +179,23 @@ class Iteration:
                 "use_svd": ``bool``,
 
                 "use_pinv": ``bool``,
-                
+
+                "hwm": ``int``,
+
+                "batch_size": ``int``,
+
+                "wire": ``str``,
+
+                "jacobian": ``str`` or ``int``,
+
+                "checkpoint_every": ``int``,
+
+                "max_wall": ``float``,
+
+                "max_steps": ``int``,
+
+                "max_tau": ``float``,
+
             }
 
         """
@@ -157,25 +223,94 @@ class Iteration:
         self.geo_parser.save_to_file(script)
         # update in database
 
-    def auto_run(self):
+    def auto_run(self, cache=True):
         """Finds the limits, applies the limits, and saves the new model if successful.
 
+        Parameters
+        ----------
+        cache : ``bool``
+            If True, reuses the reduction of a model with the same fingerprint
+            on data with the same contents instead, when there is one, and
+            saves the reduction for later otherwise.
+
         Returns
         -------
         ``bool``
             True if the iteration was successful and saved.
         """
+        if cache and self.from_fingerprint():
+            print("REDUCTION FOUND: ", self.limits)
+            self.save_iteration()
+            return True
         print("RUNNING GEODESIC")
         self.find_limits()
         print("LIMITS FOUND: ", self.limits)
         if self.apply_limits(self.limits):
             print("SUCCESSFUL EVALUATION!")
             self.save_iteration()
+            if cache:
+                self.save_fingerprint()
             return True
         else:
             print("EXCEPTIONS NEEDED")
             return False
 
+    def from_fingerprint(self):
+        """Looks for the reduction of a model with the same fingerprint on
+        data with the same contents, see ``mbam.fingerprint``. If there is one, its limits,
+        ftildes and N-1 model are renamed to the parameters and variables of
+        this model.
+
+        Returns
+        -------
+        ``bool``
+            True if a reduction was found.
+        """
+        # engine imports this module
+        from .engine import model_from_dict
+        entry = self.mongo.find_fingerprint(fingerprint(self.N), self.data_hash)
+        if entry is None:
+            return False
+        names = {canon: name for name, canon in canonical_names(self.N).items()}
+        self.limits = {names[p]: lim for p, lim in entry["limits"].items()}
+        # The new parameters are named after their combination, in the names
+        # of this model.
+        tildes = {}
+        for f in entry["ftildes"]:
+            if f["tilde"] != "epsilon":
+                tildes[f["tilde"]] = tilde_label(rename_ftildes([f], names)[0]["f"], names.values())
+        names = child_names(names, entry["model"], tildes)
+        self.ftildes = []
+        symbols = names.values()
+        for f in rename_ftildes(entry["ftildes"], names):
+            self.ftildes.append({"theta": parse_expr(f["theta"], symbols),
+                "tilde": parse_expr(f["tilde"], symbols), "limit": f["limit"], "f": f["f"],
+                "f_inv": parse_expr(f["f_inv"], symbols)})
+        self.N_minus_1 = model_from_dict(rename_model_dict(entry["model"], names))
+        self.N_minus_1.base_name = self.N.base_name
+        self.geo_id = entry["geo"]
+        return True
+
+    def save_fingerprint(self):
+        """Saves the reduction of the model in canonical names, so models with
+        the same fingerprint can reuse it, see ``from_fingerprint``.
+        """
+        names = canonical_names(self.N)
+        tildes = {}
+        for f in self.ftildes:
+            if str(f["tilde"]) != "epsilon":
+                tildes[str(f["tilde"])] = CANONICAL_T.format(len(tildes))
+        model_dict = self.N_minus_1.str_dict
+        names = child_names(names, model_dict, tildes)
+        self.mongo.save_fingerprint({
+            "fingerprint": fingerprint(self.N),
+            "data": self.data_hash,
+            "limits": {names[p]: lim for p, lim in self.limits.items()},
+            "ftildes": rename_ftildes(self.dict["ftildes"], names),
+            "model": rename_model_dict(model_dict, names),
+            "geo": self.geo_id,
+            })
+
     def save_iteration(self):
         """Adds the iteration to the database, updates the parent and child
         models with the successful iteration id.
@@ -187,6 +322,14 @@ class Iteration:
         self.mongo.push_model_to_iter(self.N_id, self.id)
         self.mongo.push_model_from_iter(self.N_minus_1_id, self.id)
 
+    @property
+    def data_hash(self):
+        """``str``: The ``data_fingerprint`` of the data file, only computed
+        once."""
+        if self._data_hash is None:
+            self._data_hash = data_fingerprint(self.data_path)
+        return self._data_hash
+
     @property
     def dict(self):
         """``dict``: Turn the iteration into a dictionary for saving."""
@@ -219,23 +362,84 @@ class Iteration:
         ``bool``
             True if the limits were applied successfully.
         """
+        for _ in self.successful_reparams(limits):
+            return True
+        # if nothing is successful, don't save the ftildes
+        self.ftildes = None
+        return False
+
+    def successful_reparams(self, limits):
+        """Tries each reparameterization of the model for the limits in turn.
+
+        Parameters
+        ----------
+        limits : ``dict``
+            Dictionary of limits to be applied to the model.
+
+        Yields
+        ------
+        ``int``
+            The index of each reparameterization that was successful. At that
+            point `N_minus_1` and `ftildes` hold its result.
+        """
         print("APPLYING")
         rep = Reparam(limits, self.mongo.get_temp_key())
         temps = self.mongo.load_templates(rep.limit_key, self.N.clss)
         fthetas = rep.get_fthetas(temps['eps'], temps['finite'])
-        for ftheta in fthetas:
+        for i, ftheta in enumerate(fthetas):
             # create ftildes
             self.solve_ftildes(ftheta)
             if len(self.ftildes) == 0:
-                return False
+                return
             self.create_tilde_subs(self.ftildes)
             # create ftide subs
             # print(self.ftildes)
             if self.apply_ftilde():
-                return True
-        # if nothing is successful, don't save the ftildes
-        self.ftildes = None
-        return False
+                yield i
+
+    def find_candidate_limits(self):
+        """Runs geodesics in both signs of the sloppiest directions until each
+        finds a limit or finishes, see ``GeodesicEnsemble``.
+
+        Returns
+        -------
+        candidates : ``list``
+            A (geo_id, limits) pair for each distinct limit found, with the
+            limits found by the most geodesics first.
+        """
+        self.init_ensemble()
+        candidates = self.geodesic.all_limits()
+        return [(geo_id, self.limit_keys_to_ps(limits)) for geo_id, limits in candidates]
+
+    def save_all_reparams(self, limits, geo_id, width):
+        """Saves every successful reparameterization for the limits, as its
+        own iteration and N-1 model.
+
+        Parameters
+        ----------
+        limits : ``dict``
+            Dictionary of limits to be applied to the model.
+        geo_id : ``str``
+            The ID of the geodesic the limits were found with.
+        width : ``int``
+            The most reparameterizations to save.
+
+        Returns
+        -------
+        model_ids : ``list``
+            The IDs of the saved N-1 models.
+        """
+        model_ids = []
+        if width <= 0:
+            return model_ids
+        for _ in self.successful_reparams(limits):
+            self.limits = limits
+            self.geo_id = geo_id
+            self.save_iteration()
+            model_ids.append(self.N_minus_1_id)
+            if len(model_ids) >= width:
+                break
+        return model_ids
 
     def apply_ftilde(self, exception=False):
         """Attempts to evaluate epsilon approaching zero. If the model is valid,
@@ -1,17 +1,61 @@
 """
 A custom client for connecting to MongoDB and managing the data flow
-for MBAM. Six collections are used in the database 'mbam':
+for MBAM. Eight collections are used in the database 'mbam':
 
 geos: geodesic storage.
+geo_chunks: the points of each geodesic, in fixed-size chunks. Geodesics can
+instead keep their points in append-only files, see ``mbam.trajectory``.
 models: model storage.
 model_data: the data read in the hdf5 files. Used in models.
 iters: successful MBAM iteration storage.
 temp_key: the key for navigating limit templates.
 temps: limit template storage.
+fingerprints: the reductions of models by their canonical fingerprint, see
+``mbam.fingerprint``.
 """
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import OperationFailure
 from bson.objectid import ObjectId
+import numpy as np
 import logging
+import os
+from .trajectory import TrajectoryWriter, TRAJECTORY_DIR, COLUMNS, read_column
+
+# The number of geodesic points stored in each document of 'geo_chunks'.
+GEO_CHUNK_SIZE = 500
+GEO_ROW_KEYS = ("x", "v", "t", "tau")
+
+def to_list(values):
+    """Converts the arrays decoded from the binary wire format into lists that
+    can be stored in MongoDB. Lists are returned unchanged.
+    """
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    return values
+
+# The reasons a geodesic stops without an error: a budget running out, see
+# GeodesicParser.budget_checks, or a cancel from a Julia worker.
+CLEAN_STOPS = ("max_steps", "max_tau", "max_wall", "cancelled")
+
+def stopped_with_error(data):
+    """
+    Parameters
+    ----------
+    data : ``dict``
+        The 'done' message sent by the geodesic.
+
+    Returns
+    -------
+    ``bool``
+        True unless the "reason" of the message is one of CLEAN_STOPS.
+    """
+    return data.get("reason") not in CLEAN_STOPS
+
+def jacobian_entry(data):
+    """Creates the entry saved for a Jacobian sent with the geodesic data.
+    The "tau" of the point identifies which point it belongs to.
+    """
+    return {"tau": float(data["tau"][0]), "j": to_list(data["j"])}
 
 class MMongo:
     def __init__(self):
@@ -23,11 +67,25 @@ class MMongo:
         client = MongoClient()
         self.db = client['mbam']
         self.geo = self.db['geos']
+        self.geo_chunks = self.db['geo_chunks']
+        # geo_id -> TrajectoryWriter for geodesics stored in files, or None
+        self.geo_writers = {}
+        # geo_id -> [n, chunk_size] for the geodesics written in chunks
+        self.geo_rows = {}
         self.models = self.db['models']
         self.data = self.db['model_data']
         self.iters = self.db['iters']
         self.temp_key = self.db['temp_key']
         self.temps = self.db['temps']
+        self.fingerprints = self.db['fingerprints']
+
+    def create_indexes(self):
+        """Creates the indexes of the collections, if they do not exist yet.
+        Only needed once per database, see examples/init_db.py, but safe to
+        run again.
+        """
+        self.geo_chunks.create_index([("geo_id", 1), ("seq", 1)], unique=True)
+        self.fingerprints.create_index([("fingerprint", 1), ("data", 1)], unique=True)
 
     def update_temp_key(self, key):
         """ Overwrites the current template key with the given `key`.
@@ -179,9 +237,142 @@ class MMongo:
         Returns
         -------
         geo_data : ``dict``
-            The data queried from the current geodesic, excluding its ID.
+            The data queried from the current geodesic, excluding its ID and
+            Jacobians. "x", "v", "t" and "tau" are lists with a row per point.
+        """
+        geo_data = self.geo.find_one({"_id": ObjectId(geo_id)}, {"_id":0, "j": 0})
+        if "chunk_size" not in geo_data and "file" not in geo_data:
+            # geodesic stored before the chunked schema
+            return geo_data
+        rows = self.query_geodesic_range(geo_id, 0)
+        for key in GEO_ROW_KEYS:
+            geo_data[key] = rows[key].tolist()
+        return geo_data
+
+    def query_geodesic_since(self, geo_id, n):
+        """Queries only the geodesic rows that were pushed after the first `n`.
+
+        Only the chunks holding those rows are read from MongoDB.
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic to query.
+        n : ``int``
+            The number of rows already read from the geodesic.
+
+        Returns
+        -------
+        geo_data : ``dict``
+            The rows of "x", "v", "t" and "tau" from index `n` onwards, and
+            "done" if the geodesic has finished.
+        """
+        return self.query_geodesic_range(geo_id, n)
+
+    def query_geodesic_range(self, geo_id, start, stop=None):
+        """Reassembles the rows `start` to `stop` of a geodesic from its chunks.
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic to query.
+        start : ``int``
+            The index of the first row.
+        stop : ``int``
+            One past the index of the last row. Defaults to the end of the
+            geodesic.
+
+        Returns
+        -------
+        geo_data : ``dict``
+            "x" and "v" as 2-D ``numpy.ndarray`` with a row per point, "t"
+            and "tau" as 1-D ``numpy.ndarray``, and "done" and "reason" if the
+            geodesic has finished. For geodesics stored in files, the arrays
+            are memory-mapped views of the files.
+        """
+        meta = self.geo.find_one({"_id": ObjectId(geo_id)}, {"_id": 0, "j": 0})
+        geo_data = {}
+        if "file" in meta:
+            for key in COLUMNS:
+                geo_data[key] = read_column(os.path.join(meta["file"], key + ".npy"), meta["n"], start, stop)
+        elif "chunk_size" not in meta:
+            # geodesic stored before the chunked schema
+            rows = {key: meta[key][start:stop] for key in GEO_ROW_KEYS}
+        else:
+            if stop is None or stop > meta["n"]:
+                stop = meta["n"]
+            size = meta["chunk_size"]
+            rows = {key: [] for key in GEO_ROW_KEYS}
+            if stop > start:
+                seqs = {"$gte": start // size, "$lte": (stop - 1) // size}
+                chunks = self.geo_chunks.find({"geo_id": geo_id, "seq": seqs}, {"_id": 0, "j": 0}).sort("seq", 1)
+                for chunk in chunks:
+                    for key in GEO_ROW_KEYS:
+                        rows[key].extend(chunk[key])
+                offset = start - (start // size) * size
+                for key in GEO_ROW_KEYS:
+                    rows[key] = rows[key][offset:offset + stop - start]
+        if "file" not in meta:
+            for key in GEO_ROW_KEYS:
+                geo_data[key] = np.array(rows[key], dtype=float)
+        # The same empty shape for every store, whether or not the length of
+        # the rows is known yet.
+        for key in ("x", "v"):
+            if len(geo_data[key]) == 0:
+                geo_data[key] = np.empty((0, 0))
+        if "done" in meta:
+            geo_data["done"] = meta["done"]
+            geo_data["reason"] = meta.get("reason")
+        return geo_data
+
+    def query_jacobians(self, geo_id):
         """
-        return self.geo.find_one({"_id": ObjectId(geo_id)}, {"_id":0})
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic to query.
+
+        Returns
+        -------
+        jacobians : ``list``
+            The Jacobians saved with the geodesic, each a dictionary holding
+            the "tau" of its point and the Jacobian "j" as a list of rows.
+        """
+        meta = self.geo.find_one({"_id": ObjectId(geo_id)}, {"_id": 0, "file": 1, "n_j": 1, "j": 1})
+        if "file" in meta:
+            js = read_column(os.path.join(meta["file"], "j.npy"), meta["n_j"])
+            taus = read_column(os.path.join(meta["file"], "j_tau.npy"), meta["n_j"])
+            return [{"tau": float(tau), "j": j.tolist()} for tau, j in zip(taus, js)]
+        jacobians = meta.get("j", [])
+        chunks = self.geo_chunks.find({"geo_id": geo_id, "j": {"$exists": True}}, {"_id": 0, "j": 1}).sort("seq", 1)
+        for chunk in chunks:
+            jacobians.extend(chunk["j"])
+        return jacobians
+
+    def watch_geodesic(self, geo_id, max_await=1.0):
+        """Opens a change stream on the metadata of a geodesic, which changes
+        whenever points are added or the geodesic finishes.
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic to watch.
+        max_await : ``float``
+            The longest time in seconds ``try_next`` waits for a change.
+
+        Returns
+        -------
+        stream : ``pymongo.change_stream.ChangeStream``
+            The change stream, or None if the server does not support change
+            streams, e.g. when it is not run as a replica set.
+        """
+        pipeline = [{"$match": {"documentKey._id": ObjectId(geo_id)}}]
+        try:
+            return self.geo.watch(pipeline, max_await_time_ms=int(max_await * 1000))
+        except OperationFailure:
+            self.logger.debug("Change streams unavailable, polling geodesic %s" %geo_id)
+            return None
 
     def push_geodesic(self, geo_id, data):
         """Append new geodesic data to the end of the current geodesic data.
@@ -193,17 +384,171 @@ class MMongo:
         data : ``dict``
             The dictionary of new data to be appended to the current geodesic.
         """
+        self.push_geodesic_many(geo_id, [data])
+
+    def push_geodesic_many(self, geo_id, data_list):
+        """Append several new geodesic points.
+
+        The points are split between fixed-size chunk documents, so each
+        update stays small no matter how long the geodesic grows.
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic to add the data to.
+        data_list : ``list``
+            A list of new data dictionaries, in the order they were received.
+        """
+        if len(data_list) == 0:
+            return
+        writer = self.geo_writer(geo_id)
+        if writer:
+            # Count the rows only once they are written, so readers never
+            # map rows that are not in the files yet.
+            added_j = writer.append(data_list)
+            self.geo.update_one({"_id": ObjectId(geo_id)}, {"$inc": {"n": len(data_list), "n_j": added_j}})
+            return
+        # Each geodesic has a single writer, so the count is only read once
+        # and only increased in MongoDB once the points are written, keeping
+        # readers from reaching past the points already in the chunks.
+        if geo_id not in self.geo_rows:
+            meta = self.geo.find_one({"_id": ObjectId(geo_id)}, {"n": 1, "chunk_size": 1})
+            self.geo_rows[geo_id] = [meta["n"], meta["chunk_size"]]
+        n, size = self.geo_rows[geo_id]
+        requests = []
+        i = 0
+        while i < len(data_list):
+            position = n + i
+            take = min(len(data_list) - i, size - position % size)
+            requests.append(self.chunk_update(geo_id, position // size, data_list[i:i + take]))
+            i += take
+        self.geo_chunks.bulk_write(requests)
+        self.geo.update_one({"_id": ObjectId(geo_id)}, {"$inc": {"n": len(data_list)}})
+        self.geo_rows[geo_id][0] += len(data_list)
+
+    def geo_writer(self, geo_id):
+        """
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic being written.
+
+        Returns
+        -------
+        writer : ``TrajectoryWriter``
+            The writer for the files of the geodesic, or None if its points
+            are stored in MongoDB.
+        """
+        if geo_id not in self.geo_writers:
+            meta = self.geo.find_one({"_id": ObjectId(geo_id)}, {"file": 1, "n": 1, "n_j": 1})
+            if "file" in meta:
+                # Rows past the counts in MongoDB were never committed.
+                rows = {key: meta["n"] for key in COLUMNS}
+                rows["j"] = rows["j_tau"] = meta["n_j"]
+                self.geo_writers[geo_id] = TrajectoryWriter(meta["file"], rows)
+            else:
+                self.geo_writers[geo_id] = None
+        return self.geo_writers[geo_id]
+
+    def chunk_update(self, geo_id, seq, data_list):
+        """Creates the update appending points to a single chunk of a
+        geodesic, creating the chunk if needed.
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic to add the data to.
+        seq : ``int``
+            The index of the chunk.
+        data_list : ``list``
+            A list of new data dictionaries that all belong to the chunk.
+
+        Returns
+        -------
+        update : ``pymongo.UpdateOne``
+            The update, to be sent with ``bulk_write``.
+        """
         push = {
-            "t": data["t"][0],
-            "tau": data["tau"][0],
-            "v": data["v"],
-            "x": data["x"],
-            # "j": data["j"],
+            "t": {"$each": [float(data["t"][0]) for data in data_list]},
+            "tau": {"$each": [float(data["tau"][0]) for data in data_list]},
+            "v": {"$each": [to_list(data["v"]) for data in data_list]},
+            "x": {"$each": [to_list(data["x"]) for data in data_list]},
+        }
+        jacobians = [jacobian_entry(data) for data in data_list if "j" in data]
+        if len(jacobians) > 0:
+            push["j"] = {"$each": jacobians}
+        return UpdateOne({"geo_id": geo_id, "seq": seq}, {"$push": push}, upsert=True)
+
+    def checkpoint_geodesic(self, geo_id, data):
+        """Saves the point a geodesic can be resumed from. Every point sent
+        before the checkpoint must already be stored.
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic.
+        data : ``dict``
+            The checkpoint message sent by the geodesic, holding the "x", "v",
+            "t" and "tau" of its last point.
+        """
+        meta = self.geo.find_one({"_id": ObjectId(geo_id)}, {"n": 1})
+        checkpoint = {
+            "n": meta["n"],
+            "x": to_list(data["x"]),
+            "v": to_list(data["v"]),
+            "t": float(data["t"][0]),
+            "tau": float(data["tau"][0]),
         }
-        self.geo.update_one({"_id": ObjectId(geo_id)}, {"$push": push})
+        self.geo.update_one({"_id": ObjectId(geo_id)}, {"$set": {"checkpoint": checkpoint}})
+
+    def rewind_geodesic(self, geo_id):
+        """Drops the points stored after the last checkpoint of a geodesic and
+        marks it as running again, so it can be resumed from the checkpoint.
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic to rewind.
 
-    def init_geodesic(self):
-        """Creates a new geodesic object inside MongoDB.
+        Returns
+        -------
+        checkpoint : ``dict``
+            The checkpoint, holding "n", the number of points kept, and the
+            "x", "v", "t" and "tau" of the last of them. None if the geodesic
+            has no checkpoint, in which case every point is dropped.
+        """
+        meta = self.geo.find_one({"_id": ObjectId(geo_id)}, {"file": 1, "n_j": 1, "chunk_size": 1, "checkpoint": 1})
+        checkpoint = meta.get("checkpoint")
+        n = checkpoint["n"] if checkpoint else 0
+        tau = checkpoint["tau"] if checkpoint else float("-inf")
+        update = {"$set": {"n": n}, "$unset": {"done": "", "reason": ""}}
+        writer = self.geo_writers.pop(geo_id, None)
+        if writer:
+            writer.close()
+        self.geo_rows.pop(geo_id, None)
+        if "file" in meta:
+            taus = read_column(os.path.join(meta["file"], "j_tau.npy"), meta["n_j"])
+            update["$set"]["n_j"] = int(np.count_nonzero(taus <= tau))
+        else:
+            size = meta["chunk_size"]
+            self.geo_chunks.delete_many({"geo_id": geo_id, "seq": {"$gte": -(-n // size)}})
+            if n % size:
+                trim = {key: {"$each": [], "$slice": n % size} for key in GEO_ROW_KEYS}
+                self.geo_chunks.update_one({"geo_id": geo_id, "seq": n // size},
+                    {"$push": trim, "$pull": {"j": {"tau": {"$gt": tau}}}})
+            update["$pull"] = {"j": {"tau": {"$gt": tau}}}
+        self.geo.update_one({"_id": ObjectId(geo_id)}, update)
+        return checkpoint
+
+    def init_geodesic(self, store="chunks"):
+        """Creates a new geodesic object inside MongoDB. The object only holds
+        the metadata.
+
+        Parameters
+        ----------
+        store : ``str``
+            "chunks" to store the points in the 'geo_chunks' collection, or
+            "files" to store them in append-only files under TRAJECTORY_DIR.
 
         Returns
         -------
@@ -212,25 +557,52 @@ class MMongo:
         """
         post = {
             # "name": self.model_name,
-            "t": [],
-            "tau": [],
-            "v": [],
-            "x": [],
-            # "j": [],
+            "n": 0,
+            "chunk_size": GEO_CHUNK_SIZE,
+            "j": [],
         }
-        return str(self.geo.insert_one(post).inserted_id)
-
-    def finish_geodesic(self, geo_id, exception=False):
+        if store == "files":
+            post = {"n": 0, "n_j": 0}
+        geo_id = str(self.geo.insert_one(post).inserted_id)
+        if store == "files":
+            path = os.path.abspath(os.path.join(TRAJECTORY_DIR, geo_id))
+            self.geo.update_one({"_id": ObjectId(geo_id)}, {"$set": {"file": path}})
+        return geo_id
+
+    def finish_geodesic(self, geo_id, exception=False, data=None):
         """Marks the geodesic as 'done' inside MongoDB.
 
         This allows the object waiting for the geodesic to finish to know
         it has completed.
+
+        Parameters
+        ----------
+        geo_id : ``str``
+            The ID for the geodesic that finished.
+        exception : ``bool``
+            True if the geodesic ended with an exception.
+        data : ``dict``
+            The 'done' message sent by the geodesic. The Jacobian of the final
+            point is saved if it was sent with the message, and so is the
+            "reason" the geodesic stopped.
         """
         if exception:
             done = "exception"
         else:
             done = "done"
-        self.geo.update_one({"_id":ObjectId(geo_id)}, {"$set": {"done": done}})
+        update = {"$set": {"done": done}}
+        if data and "reason" in data:
+            update["$set"]["reason"] = data["reason"]
+        writer = self.geo_writer(geo_id)
+        self.geo_writers.pop(geo_id)
+        self.geo_rows.pop(geo_id, None)
+        if writer:
+            if data and "j" in data:
+                update["$inc"] = {"n_j": writer.append_jacobians([data])}
+            writer.close()
+        elif data and "j" in data:
+            update["$push"] = {"j": jacobian_entry(data)}
+        self.geo.update_one({"_id":ObjectId(geo_id)}, update)
 
     def get_hasse_children(self, model_id):
         """Returns the length of a model's successful iterations.
@@ -250,6 +622,27 @@ class MMongo:
         """
         return len(self.models.find_one({"_id": ObjectId(model_id)})['to_iter'])
 
+    def get_model_children(self, model_id):
+        """Follows the successful iterations of a model to its N-1 models.
+
+        Parameters
+        ----------
+        model_id : ``str``
+            The id for the parent model.
+
+        Returns
+        -------
+        model_ids : ``list``
+            The ids of the child models, in the order they were saved.
+        """
+        model = self.models.find_one({"_id": ObjectId(model_id)}, {"to_iter": 1})
+        model_ids = []
+        for iter_id in model['to_iter']:
+            iteration = self.iters.find_one({"_id": ObjectId(iter_id)}, {"to_model": 1})
+            if iteration and iteration['to_model']:
+                model_ids.append(str(iteration['to_model']))
+        return model_ids
+
     def push_model_to_iter(self, model_id, iter_id):
         """Add the successful iteration id to the parent model.
 
@@ -289,6 +682,37 @@ class MMongo:
         """
         return str(self.iters.insert_one(iteration).inserted_id)
 
+    def find_fingerprint(self, fingerprint, data):
+        """Looks for a reduction of a model with the given fingerprint.
+
+        Parameters
+        ----------
+        fingerprint : ``str``
+            The fingerprint of the model, see ``mbam.fingerprint``.
+        data : ``str``
+            The hash of the hdf5 data file the model was reduced with, see
+            ``mbam.fingerprint.data_fingerprint``.
+
+        Returns
+        -------
+        entry : ``dict``
+            The saved reduction, or None if the model has not been reduced.
+        """
+        return self.fingerprints.find_one({"fingerprint": fingerprint, "data": data}, {"_id": 0})
+
+    def save_fingerprint(self, entry):
+        """Saves the reduction of a model by its fingerprint, replacing an
+        earlier one of the same model and data.
+
+        Parameters
+        ----------
+        entry : ``dict``
+            The reduction in canonical names. Must contain "fingerprint" and
+            "data".
+        """
+        self.fingerprints.replace_one({"fingerprint": entry["fingerprint"], "data": entry["data"]},
+            entry, upsert=True)
+
     def save_model(self, mbam_model, data_id=None):
         """
 
@@ -16,14 +16,16 @@ class BaseParser:
             Can be any of the following: Function, ODE, DAE.
         data_path : ``str``
             The full path to the hdf5 file to be included in the
-            model.
+            model. The script reads the data from this path as given, so
+            it must be absolute unless the data is in the directory Julia is
+            started from, like the 'temp.h5' used when no path is given.
         """
         self.logger = logging.getLogger("MBAM.BaseParser")
         self.logger.debug("Initializing BaseParser")
         self.mm = mbam_model
         self.create_default_options()
-        # self.data_path = data_path
-        self.data_path = 'temp.h5' # os.path.join(os.pardir, 'temp.h5') # data should be in parent directory
+        # models reduced side by side each read their own data file
+        self.data_path = data_path if data_path else 'temp.h5' # os.path.join(os.pardir, 'temp.h5') # data should be in parent directory
         self.script = '\n'
         self.dir = os.path.join("julia_scripts", "models")
         self.name = self.mm.name
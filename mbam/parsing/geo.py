@@ -1,8 +1,19 @@
 
 import os
 
+
+def julia_vector(values):
+    """Writes a list of numbers as a Julia vector literal.
+    """
+    return "[{0}]".format(", ".join(repr(float(value)) for value in values))
+
+
 ### ALL JULIA SCRIPTS ONLY USE " " FOR STRINGS, SO USE ' ' FOR PYTHON PARSING TO JULIA.
 class GeodesicParser:
+    # Options passed on to Models.GeodesicIntegrator. The rest of the options
+    # control the generated script itself.
+    INTEGRATOR_OPTIONS = ("tmax", "lambda", "abstol", "reltol", "use_svd", "use_pinv")
+
     def __init__(self, mbam_model, model_path, collector_path):
         """
         Parameters
@@ -17,6 +28,9 @@ class GeodesicParser:
         self.model_path = model_path
         self.mm = mbam_model
         self.collector_path = collector_path
+        # The checkpoint the script being written starts from, see
+        # resume_script.
+        self.resume = None
         self.default_options()
         self.dir = os.path.join("julia_scripts", "geos")
         # self.dir = "julia_scripts"
@@ -37,6 +51,14 @@ class GeodesicParser:
             "reltol": 1e-3,
             "use_svd": False,
             "use_pinv": False,
+            "hwm": 1000,
+            "batch_size": 10,
+            "wire": "json",
+            "jacobian": "never",
+            "checkpoint_every": 100,
+            "max_wall": 0,
+            "max_steps": 0,
+            "max_tau": 0,
         }
 
     def update_options(self, options):
@@ -61,20 +83,80 @@ class GeodesicParser:
 
                 "use_pinv": ``bool``,
 
+                "hwm": ``int``,
+
+                "batch_size": ``int``,
+
+                "wire": ``str``,
+
+                "jacobian": ``str`` or ``int``,
+
+                "checkpoint_every": ``int``,
+
+                "max_wall": ``float``,
+
+                "max_steps": ``int``,
+
+                "max_tau": ``float``,
+
             }
 
+            "hwm" is the number of messages queued by the Julia sender before
+            it blocks, and "batch_size" the number of steps sent per message.
+            "wire" is either "json" or "binary", which sends raw float64
+            frames instead of JSON text. "jacobian" is "never", "final" to
+            send the Jacobian at the last point only, or k to send it every k
+            steps. "checkpoint_every" is the number of steps between the
+            checkpoints a geodesic can be resumed from, 0 for none.
+            "max_wall" (seconds), "max_steps" and "max_tau" stop the geodesic
+            cleanly once it runs that long, 0 for no limit. The 'done'
+            message then holds the "reason" it stopped. Options left out keep
+            their default values.
         """
-        self.options = options
+        self.default_options()
+        self.options.update(options)
         self.write_geo_script()
         self.save_to_file(self.script)
 
+    def resume_script(self, checkpoint, geo_id):
+        """Creates and saves a script that starts a geodesic from a checkpoint
+        instead of the initial parameters.
+
+        The script is saved next to the script of the model under a name of
+        its own, so geodesics started from the model script are not affected.
+
+        Parameters
+        ----------
+        checkpoint : ``dict``
+            The checkpoint returned by ``MMongo.rewind_geodesic``, or None to
+            start from the initial parameters.
+        geo_id : ``str``
+            The ID of the geodesic being resumed.
+
+        Returns
+        -------
+        file_path : ``str``
+            The path to the script.
+        """
+        script = self.script
+        self.resume = checkpoint
+        try:
+            self.write_geo_script()
+            resume_script = self.script
+        finally:
+            self.resume = None
+            self.script = script
+        file_path = os.path.join(self.dir, "{0}_resume_{1}.jl".format(self.model_name, geo_id))
+        self.save_to_file(resume_script, file_path)
+        return file_path
+
     def init_geos_dir(self):
         if not os.path.exists(self.dir):
             os.makedirs(self.dir)
 
-    def save_to_file(self, script):
+    def save_to_file(self, script, file_path=None):
         self.init_geos_dir()
-        with open(self.file_path, "w", encoding="utf-8") as jl:
+        with open(file_path if file_path else self.file_path, "w", encoding="utf-8") as jl:
             jl.write(script)
 
     def write_geo_script(self):
@@ -87,6 +169,7 @@ class GeodesicParser:
         ret = 'module T\n'
         ret += 'import Models\n'
         ret += 'import Geometry\n'
+        ret += 'import LinearAlgebra\n'
 
         # changing file referencing to relative file paths!
         # ret += 'include("{0}")\n'.format(self.model_path)
@@ -95,18 +178,42 @@ class GeodesicParser:
         ret += 'include("{0}")\n'.format(os.path.join(os.pardir, os.pardir, 'geosender.jl')).replace("\\", "\\\\")
 
         ret += 'model = {0}_Model.model\n'.format(self.model_name)
-        ret += 'xi = {0}_Model.xi\n'.format(self.model_name)
-        ret += 'v = Geometry.Geodesics.vi(xi, model.jacobian, model.Avv)\n'
+        # Set by Geodesic.start: the address to send the data to, the index
+        # of the initial direction (0 is the sloppiest) and its sign.
+        ret += 'endpoint = length(ARGS) > 0 ? ARGS[1] : GeoSender.ADDRESS\n'
+        ret += 'direction = length(ARGS) > 1 ? parse(Int, ARGS[2]) : 0\n'
+        ret += 'vsign = length(ARGS) > 2 ? parse(Float64, ARGS[3]) : 1.0\n'
+        if self.resume:
+            ret += 'xi = {0}\n'.format(julia_vector(self.resume["x"]))
+            ret += 'v = {0}\n'.format(julia_vector(self.resume["v"]))
+            ret += 'tau0 = {0}\n'.format(float(self.resume["tau"]))
+        else:
+            ret += 'xi = {0}_Model.xi\n'.format(self.model_name)
+            ret += 'if direction == 0\n'
+            ret += '\tv = vsign * Geometry.Geodesics.vi(xi, model.jacobian, model.Avv)\n'
+            ret += 'else\n'
+            ret += '\tv = vsign * LinearAlgebra.svd(model.jacobian(xi)).V[:, end - direction]\n'
+            ret += 'end\n'
+            ret += 'tau0 = 0.0\n'
         # Add function to include options here in integrator
         ret += 'integrator = Models.GeodesicIntegrator(model, xi, v, '
         ret += self.load_options() + ")\n"
         ret += 'start = Dict("x"=> [], "v"=> [], "tau"=> [], "t"=> [], "j"=>[])\n'
+        ret += 'sender = GeoSender.Sender(endpoint, hwm={0}, binary={1})\n'.format(
+            self.options["hwm"], "true" if self.options["wire"] == "binary" else "false")
+        ret += 'batch = []\n'
+        ret += 'steps = Ref(0)\n'
+        ret += 'last_update = Ref{Any}(nothing)\n'
+        # Why the geodesic stopped, sent with the 'done' message.
+        ret += 'reason = Ref("except")\n'
+        ret += 'started = time()\n'
         # ret += 'GeoSender.send_to_py("start", start)\n'
         return ret
 
     def load_options(self):
         to_ret = ''
-        for i, opt in enumerate(self.options):
+        integrator_options = [opt for opt in self.options if opt in self.INTEGRATOR_OPTIONS]
+        for i, opt in enumerate(integrator_options):
             to_ret += opt
             to_ret += "="
             if (isinstance(self.options[opt], bool)):
@@ -116,41 +223,108 @@ class GeodesicParser:
                     to_ret += "false"
             else:
                 to_ret += str(self.options[opt])
-            if i != len(self.options)-1:
+            if i != len(integrator_options)-1:
                 to_ret += ", "
         return to_ret
 
 
+    def jacobian_every(self):
+        """
+        Returns
+        -------
+        every : ``int``
+            How many steps apart the Jacobian is sent with a point, or 0 if it
+            is never sent with the points.
+        """
+        if self.options["jacobian"] in ("never", "final"):
+            return 0
+        return int(self.options["jacobian"])
+
     def geo_loop(self):
         ret = 'try\n'
         ret += '\twhile true\n'
         ret += '\t\tGeometry.Geodesics.step!(integrator)\n'
+        # Inside julia_worker.jl, let the worker answer requests between steps
+        # and stop the script when it is cancelled.
+        ret += '\t\tif isdefined(Main, :GEO_CANCEL)\n'
+        ret += '\t\t\tyield()\n'
+        ret += '\t\t\tif Main.GEO_CANCEL[]\n'
+        ret += '\t\t\t\treason[] = "cancelled"\n'
+        ret += '\t\t\t\tbreak\n'
+        ret += '\t\t\tend\n'
+        ret += '\t\tend\n'
         ret += '\t\tsol = Geometry.Geodesics.solution(integrator)\n'
-        ret += '\t\tj = model.jacobian(sol.xs[end, :])\n'
-        ret += '\t\tupdate = Dict(\n'
+        ret += '\t\tsteps[] += 1\n'
+        ret += '\t\tupdate = Dict{String, Any}(\n'
         ret += '\t\t\t"x"=>sol.xs[end, :],\n'
         ret += '\t\t\t"v"=>sol.vs[end, :],\n'
-        ret += '\t\t\t"tau"=>sol.τs[end, :],\n'
+        ret += '\t\t\t"tau"=>sol.τs[end, :] .+ tau0,\n'
         ret += '\t\t\t"t"=>sol.ts[end, :],\n'
-        ret += '\t\t\t"j"=>j,\n'
         ret += '\t\t)\n'
-        ret += '\t\tpush = false\n'
-        ret += '\t\twhile !push\n'
-        ret += '\t\t\ttry\n'
-        ret += '\t\t\t\tGeoSender.send_to_py(update)\n'
-        ret += '\t\t\t\tpush = true\n'
-        ret += '\t\t\tcatch\n'
-        ret += '\t\t\t\tsleep(.4)\n'
-        ret += '\t\t\tend\n'
+        every = self.jacobian_every()
+        if every:
+            ret += '\t\tif steps[] % {0} == 0\n'.format(every)
+            ret += '\t\t\tupdate["j"] = model.jacobian(sol.xs[end, :])\n'
+            ret += '\t\tend\n'
+        ret += '\t\tlast_update[] = update\n'
+        ret += '\t\tpush!(batch, update)\n'
+        ret += '\t\tif length(batch) >= {0}\n'.format(self.options["batch_size"])
+        ret += '\t\t\tGeoSender.send_batch(sender, batch)\n'
+        ret += '\t\t\tempty!(batch)\n'
         ret += '\t\tend\n'
+        every = self.options["checkpoint_every"]
+        if every:
+            # Everything before the checkpoint is sent first, so it is stored
+            # by the time the checkpoint is.
+            ret += '\t\tif steps[] % {0} == 0\n'.format(every)
+            ret += '\t\t\tGeoSender.send_batch(sender, batch)\n'
+            ret += '\t\t\tempty!(batch)\n'
+            ret += '\t\t\tGeoSender.send(sender, Dict("checkpoint"=>steps[], "x"=>update["x"], "v"=>update["v"], '
+            ret += '"tau"=>update["tau"], "t"=>update["t"]))\n'
+            ret += '\t\tend\n'
+        ret += self.budget_checks()
         ret += '\tend\n'
         return ret
 
+    def budget_checks(self):
+        """
+        Returns
+        -------
+        checks : ``str``
+            The Julia code ending the geodesic loop once the "max_steps",
+            "max_tau" or "max_wall" option is reached.
+        """
+        checks = [
+            ("max_steps", 'steps[] >= {0}'),
+            ("max_tau", 'abs(update["tau"][1]) >= {0}'),
+            ("max_wall", 'time() - started >= {0}'),
+        ]
+        ret = ''
+        for option, condition in checks:
+            if self.options[option]:
+                ret += '\t\tif ' + condition.format(self.options[option]) + '\n'
+                ret += '\t\t\treason[] = "{0}"\n'.format(option)
+                ret += '\t\t\tbreak\n'
+                ret += '\t\tend\n'
+        return ret
+
     def end_script(self):
         ret = 'catch E\n'
         # ret += '\tGeoSender.send_to_py("end", Dict())\n'
         ret += '\tprintln(E)\n'
-        ret += '\tGeoSender.send_to_py(Dict("done"=> "except"))\n'
         ret += 'end\n'
+        # Reached when the integrator ends or fails, and when a budget runs out.
+        ret += 'GeoSender.send_batch(sender, batch)\n'
+        ret += 'done = Dict{String, Any}("done"=> "except", "reason"=> reason[])\n'
+        if self.options["jacobian"] == "final":
+            ret += 'if last_update[] !== nothing\n'
+            ret += '\ttry\n'
+            ret += '\t\tdone["j"] = model.jacobian(last_update[]["x"])\n'
+            ret += '\t\tdone["tau"] = last_update[]["tau"]\n'
+            ret += '\tcatch\n'
+            ret += '\tend\n'
+            ret += 'end\n'
+        ret += 'GeoSender.send(sender, done)\n'
+        ret += 'close(sender)\n'
         ret += 'end # module'
         return ret
@@ -0,0 +1,163 @@
+"""
+Replays limit detection over geodesics already stored in MongoDB, so a
+``StabilityPolicy`` can be tuned against past runs without rerunning Julia.
+
+Each geodesic is read in blocks and fed through a ``LimitDetector``. Geodesics
+are spread over a pool of processes, each with its own MongoDB client.
+"""
+from multiprocessing import Pool
+from functools import partial
+from bson.objectid import ObjectId
+from .mongo import MMongo
+from .detection import LimitDetector
+
+# The number of rows read from a geodesic at once.
+REPLAY_BLOCK = 5000
+
+# The client of each worker process, created by init_worker.
+worker_mongo = None
+
+
+def init_worker():
+    """Connects a worker process of the pool to MongoDB.
+    """
+    global worker_mongo
+    worker_mongo = MMongo()
+
+
+def geodesic_blocks(mongo, geo_id, block=REPLAY_BLOCK):
+    """Reads a stored geodesic in blocks of rows.
+
+    Geodesics stored before the chunked schema keep every point in a single
+    document, which is loaded once and sliced instead of once per block.
+
+    Parameters
+    ----------
+    mongo : ``MMongo``
+        The client to read the geodesic with.
+    geo_id : ``str``
+        The ID of the geodesic to read.
+    block : ``int``
+        The number of rows read at once.
+
+    Yields
+    ------
+    geo_data : ``dict``
+        The next rows, as returned by ``MMongo.query_geodesic_range``. The
+        last block has no rows.
+    """
+    legacy = "n" not in mongo.geo.find_one({"_id": ObjectId(geo_id)}, {"n": 1})
+    if legacy:
+        geodesic = mongo.query_geodesic_range(geo_id, 0)
+    start = 0
+    while True:
+        if legacy:
+            geo_data = {key: val[start:start + block] if key in ("x", "v", "t", "tau") else val
+                for key, val in geodesic.items()}
+        else:
+            geo_data = mongo.query_geodesic_range(geo_id, start, start + block)
+        yield geo_data
+        if len(geo_data["v"]) == 0:
+            return
+        start += len(geo_data["v"])
+
+
+def replay_geodesic(geo_id, policy=None, mongo=None, block=REPLAY_BLOCK):
+    """Finds where the limit of a stored geodesic would have been detected.
+
+    Parameters
+    ----------
+    geo_id : ``str``
+        The ID of the geodesic to replay.
+    policy : ``StabilityPolicy``
+        The rules used to detect the limit. Defaults to ``StabilityPolicy()``.
+    mongo : ``MMongo``
+        The client to read the geodesic with. Defaults to the client of the
+        worker process.
+    block : ``int``
+        The number of rows read at once.
+
+    Returns
+    -------
+    result : ``dict``
+        "geo_id", "limits" (the last limit inferred, or None), "stable",
+        "row" and "tau" (where the limit became stable, or None), "n" (the
+        number of rows read) and "done" (how the geodesic ended, or None).
+    """
+    if mongo is None:
+        mongo = worker_mongo if worker_mongo else MMongo()
+    detector = LimitDetector(policy)
+    result = {"geo_id": geo_id, "row": None, "tau": None, "done": None}
+    start = 0
+    for geo_data in geodesic_blocks(mongo, geo_id, block):
+        result["done"] = geo_data.get("done")
+        if len(geo_data["v"]) == 0:
+            break
+        if detector.update(geo_data["v"], geo_data["tau"]):
+            result["row"] = detector.stable_row
+            result["tau"] = float(geo_data["tau"][detector.stable_row - start])
+        start += len(geo_data["v"])
+        if detector.stable:
+            break
+    result["limits"] = detector.limits
+    result["stable"] = detector.stable
+    result["n"] = start
+    return result
+
+
+def stored_geodesics(mongo=None, done=None):
+    """
+    Parameters
+    ----------
+    mongo : ``MMongo``
+        The client to query with.
+    done : ``bool``
+        If True, only the geodesics marked as 'done', which excludes those
+        killed once their limit was stable. If False, only the others. By
+        default, both.
+
+    Returns
+    -------
+    geo_ids : ``list``
+        The IDs of every geodesic with points stored in MongoDB.
+    """
+    if mongo is None:
+        mongo = MMongo()
+    # Geodesics stored before the chunked schema have no count of their
+    # points, only the points themselves.
+    query = {"$or": [{"n": {"$gt": 0}}, {"n": {"$exists": False}, "v.0": {"$exists": True}}]}
+    if done is not None:
+        query["done"] = {"$exists": done}
+    return [str(geo["_id"]) for geo in mongo.geo.find(query, {"_id": 1})]
+
+
+def replay(geo_ids=None, policy=None, processes=None, block=REPLAY_BLOCK, done=None):
+    """Replays limit detection over many stored geodesics in parallel.
+
+    Parameters
+    ----------
+    geo_ids : ``list``
+        The IDs of the geodesics to replay. Defaults to every stored
+        geodesic, see ``stored_geodesics``.
+    policy : ``StabilityPolicy``
+        The rules used to detect the limits.
+    processes : ``int``
+        The number of worker processes. Defaults to the number of CPUs.
+    block : ``int``
+        The number of rows read at once.
+    done : ``bool``
+        Passed on to ``stored_geodesics`` when `geo_ids` is not given.
+
+    Returns
+    -------
+    results : ``list``
+        The result of ``replay_geodesic`` for each geodesic, in the order of
+        `geo_ids`.
+    """
+    if geo_ids is None:
+        geo_ids = stored_geodesics(done=done)
+    if len(geo_ids) == 0:
+        return []
+    replay_one = partial(replay_geodesic, policy=policy, block=block)
+    with Pool(processes, initializer=init_worker) as pool:
+        return pool.map(replay_one, geo_ids)
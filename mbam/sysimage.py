@@ -0,0 +1,133 @@
+"""
+Builds a custom Julia system image with the packages used by the geodesic
+scripts already compiled, using PackageCompiler.jl. Once built, geodesics and
+Julia workers are started with it automatically, so they no longer spend tens
+of seconds loading and compiling those packages.
+"""
+import subprocess
+import tempfile
+import sys
+import os
+
+# The packages compiled into the system image.
+SYSIMAGE_PACKAGES = ("Models", "Geometry", "ParametricModels", "ZMQ", "JSON", "HDF5")
+SYSIMAGE_DIR = "julia_scripts"
+# The file containing the GeoSender module, next to julia_worker.jl.
+GEOSENDER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geosender.jl")
+
+
+def default_sysimage_path():
+    """
+    Returns
+    -------
+    path : ``str``
+        Where the system image is built and looked for, with the shared
+        library extension of the platform.
+    """
+    if sys.platform.startswith("win"):
+        ext = ".dll"
+    elif sys.platform == "darwin":
+        ext = ".dylib"
+    else:
+        ext = ".so"
+    return os.path.abspath(os.path.join(SYSIMAGE_DIR, "mbam_sysimage" + ext))
+
+
+def find_sysimage(path=None):
+    """
+    Parameters
+    ----------
+    path : ``str``
+        The system image to look for. Defaults to ``default_sysimage_path()``.
+
+    Returns
+    -------
+    path : ``str``
+        The system image, or None if it has not been built.
+    """
+    if path is None:
+        path = default_sysimage_path()
+    return path if os.path.exists(path) else None
+
+
+def julia_command(path=None):
+    """
+    Parameters
+    ----------
+    path : ``str``
+        The system image to use, if it has been built.
+
+    Returns
+    -------
+    command : ``list``
+        The command starting Julia, with the system image when there is one.
+    """
+    sysimage = find_sysimage(path)
+    if sysimage:
+        return ['julia', '--sysimage=' + sysimage]
+    return ['julia']
+
+
+def has_package_compiler():
+    """
+    Returns
+    -------
+    ``bool``
+        True if PackageCompiler.jl is installed in the Julia environment.
+    """
+    check = 'exit(Base.find_package("PackageCompiler") === nothing ? 1 : 0)'
+    return subprocess.run(['julia', '-e', check]).returncode == 0
+
+
+def precompile_script():
+    """
+    Returns
+    -------
+    script : ``str``
+        Julia code run while the system image is built, so the ZMQ and JSON
+        methods GeoSender calls are compiled into it as well. GeoSender itself
+        is not in the image: each geodesic script includes geosender.jl into
+        its own module, so its few methods are still compiled per script.
+    """
+    ret = 'include("{0}")\n'.format(GEOSENDER_PATH).replace("\\", "\\\\")
+    ret += 'sender = GeoSender.Sender("tcp://127.0.0.1:5556")\n'
+    ret += 'GeoSender.JSON.json([Dict{String, Any}("x"=>[1.0], "v"=>[1.0], "tau"=>[0.0], "t"=>[0.0])])\n'
+    ret += 'close(sender)\n'
+    return ret
+
+
+def build_sysimage(path=None, packages=SYSIMAGE_PACKAGES):
+    """Builds the system image. Takes several minutes, and raises a
+    RuntimeError if PackageCompiler.jl is not installed.
+
+    Parameters
+    ----------
+    path : ``str``
+        Where to save the system image. Defaults to
+        ``default_sysimage_path()``.
+    packages : ``tuple``
+        The names of the packages to compile into it.
+
+    Returns
+    -------
+    ``bool``
+        True if the system image was built.
+    """
+    if not has_package_compiler():
+        raise RuntimeError('PackageCompiler.jl is not installed, add it with: '
+            'julia -e \'using Pkg; Pkg.add("PackageCompiler")\'')
+    if path is None:
+        path = default_sysimage_path()
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with tempfile.NamedTemporaryFile("w", suffix=".jl", delete=False) as f:
+        f.write(precompile_script())
+        execution_file = f.name
+    build = 'using PackageCompiler\n'
+    build += 'create_sysimage([{0}]; sysimage_path="{1}", precompile_execution_file="{2}")\n'.format(
+        ", ".join(":" + package for package in packages), path, execution_file).replace("\\", "\\\\")
+    try:
+        return subprocess.run(['julia', '-e', build]).returncode == 0
+    finally:
+        os.remove(execution_file)
@@ -0,0 +1,229 @@
+"""
+Append-only on-disk storage for geodesic trajectories, and the in-memory
+buffer a running ``Geodesic`` keeps of its own trajectory.
+
+Each geodesic gets a directory holding one growable .npy file per column:
+"x", "v", "t" and "tau", plus "j" and "j_tau" for any Jacobians that were sent.
+Rows are only ever appended, so the files can be memory-mapped while the
+geodesic is still running. MongoDB holds the directory and the number of rows
+written, which is the number of rows that are safe to read.
+"""
+import os
+import struct
+import numpy as np
+
+TRAJECTORY_DIR = "trajectories"
+COLUMNS = ("x", "v", "t", "tau")
+# Fixed length of the .npy header, so it can be rewritten in place as the
+# file grows. Must be a multiple of 64.
+HEADER_LEN = 128
+
+
+def write_header(f, rows, row_shape):
+    """Writes a version 1.0 .npy header for float64 data at the start of `f`.
+
+    Parameters
+    ----------
+    f : ``file``
+        The column file opened for writing.
+    rows : ``int``
+        The number of rows in the file.
+    row_shape : ``tuple``
+        The shape of each row.
+    """
+    header = repr({"descr": "<f8", "fortran_order": False, "shape": (rows,) + tuple(row_shape)})
+    header = header.encode("latin1")
+    prefix = b"\x93NUMPY\x01\x00" + struct.pack("<H", HEADER_LEN - 10)
+    f.seek(0)
+    f.write(prefix + header + b" " * (HEADER_LEN - len(prefix) - len(header) - 1) + b"\n")
+
+
+def read_column(path, rows, start=0, stop=None):
+    """Memory-maps the first `rows` rows of a column file.
+
+    Parameters
+    ----------
+    path : ``str``
+        The path to the column file.
+    rows : ``int``
+        The number of rows known to be written.
+    start : ``int``
+        The index of the first row to return.
+    stop : ``int``
+        One past the index of the last row to return.
+
+    Returns
+    -------
+    values : ``numpy.ndarray``
+        A read-only view of the rows. Empty rows keep the shape of the rows in
+        the file, if it exists.
+    """
+    if not os.path.exists(path):
+        return np.empty((0,))
+    with open(path, "rb") as f:
+        np.lib.format.read_magic(f)
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        offset = f.tell()
+    if rows == 0:
+        return np.empty((0,) + shape[1:], dtype=dtype)
+    values = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(rows,) + shape[1:])
+    return values[start:stop]
+
+
+class TrajectoryWriter:
+    """Appends geodesic points to the column files of one geodesic.
+    """
+    def __init__(self, directory, rows=None):
+        """
+        Parameters
+        ----------
+        directory : ``str``
+            The directory holding the column files of the geodesic.
+        rows : ``dict``
+            The number of rows to keep in each existing column file, e.g. when
+            a geodesic is resumed. Rows past them are overwritten.
+        """
+        self.directory = directory
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.files = {}
+        self.rows = dict(rows) if rows else {}
+
+    def path(self, column):
+        return os.path.join(self.directory, column + ".npy")
+
+    def append_column(self, column, values):
+        """Appends rows to a column file, creating the file if needed.
+
+        Parameters
+        ----------
+        column : ``str``
+            The name of the column.
+        values : ``numpy.ndarray``
+            The new rows, stacked along the first axis.
+        """
+        values = np.ascontiguousarray(values, dtype="<f8")
+        if column not in self.files:
+            if self.rows.get(column, 0) > 0 and os.path.exists(self.path(column)):
+                self.files[column] = open(self.path(column), "r+b")
+                self.files[column].truncate(HEADER_LEN + self.rows[column] * values[0].nbytes)
+            else:
+                self.files[column] = open(self.path(column), "w+b")
+                self.rows[column] = 0
+            write_header(self.files[column], self.rows[column], values.shape[1:])
+        f = self.files[column]
+        f.seek(0, os.SEEK_END)
+        f.write(values.tobytes())
+        self.rows[column] += len(values)
+        # The data is written before the header is updated, so the header
+        # never claims rows that are not there yet.
+        f.flush()
+        write_header(f, self.rows[column], values.shape[1:])
+        f.flush()
+
+    def append(self, data_list):
+        """Appends geodesic points to the trajectory.
+
+        Parameters
+        ----------
+        data_list : ``list``
+            A list of new data dictionaries, in the order they were received.
+
+        Returns
+        -------
+        added_j : ``int``
+            The number of Jacobians that were appended.
+        """
+        self.append_column("x", [data["x"] for data in data_list])
+        self.append_column("v", [data["v"] for data in data_list])
+        self.append_column("t", [data["t"][0] for data in data_list])
+        self.append_column("tau", [data["tau"][0] for data in data_list])
+        return self.append_jacobians([data for data in data_list if "j" in data])
+
+    def append_jacobians(self, data_list):
+        """Appends the Jacobians sent with geodesic points or the 'done' message.
+
+        Parameters
+        ----------
+        data_list : ``list``
+            A list of data dictionaries that each hold a Jacobian "j".
+
+        Returns
+        -------
+        added_j : ``int``
+            The number of Jacobians that were appended.
+        """
+        if len(data_list) > 0:
+            self.append_column("j", [data["j"] for data in data_list])
+            self.append_column("j_tau", [data["tau"][0] for data in data_list])
+        return len(data_list)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+
+class TrajectoryBuffer:
+    """Keeps the rows of a running geodesic in preallocated NumPy arrays.
+
+    The arrays double in size whenever they run out of room, so appending is
+    amortized constant time per row, and the rows read so far can be served
+    as views without rebuilding them.
+    """
+    def __init__(self, capacity=1024):
+        """
+        Parameters
+        ----------
+        capacity : ``int``
+            The number of rows allocated before the first doubling.
+        """
+        self.capacity = capacity
+        self.n = 0
+        self.arrays = {}
+
+    def __len__(self):
+        return self.n
+
+    def append(self, geo_data):
+        """Copies new rows to the end of the buffer.
+
+        Parameters
+        ----------
+        geo_data : ``dict``
+            The new rows of "x", "v", "t" and "tau".
+        """
+        rows = {key: np.asarray(geo_data[key], dtype=float) for key in COLUMNS}
+        added = len(rows["v"])
+        if added == 0:
+            return
+        if len(self.arrays) == 0:
+            for key in COLUMNS:
+                self.arrays[key] = np.empty((self.capacity,) + rows[key].shape[1:])
+        if self.n + added > self.capacity:
+            self.capacity = max(2*self.capacity, self.n + added)
+            for key in COLUMNS:
+                grown = np.empty((self.capacity,) + self.arrays[key].shape[1:])
+                grown[:self.n] = self.arrays[key][:self.n]
+                self.arrays[key] = grown
+        for key in COLUMNS:
+            self.arrays[key][self.n:self.n + added] = rows[key]
+        # Only count the rows once they are copied, readers rely on it.
+        self.n += added
+
+    def view(self, key):
+        """
+        Parameters
+        ----------
+        key : ``str``
+            One of "x", "v", "t" or "tau".
+
+        Returns
+        -------
+        values : ``numpy.ndarray``
+            A view of every row added so far.
+        """
+        n = self.n
+        if key not in self.arrays:
+            return np.empty((0,))
+        return self.arrays[key][:n]
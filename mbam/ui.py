@@ -18,6 +18,7 @@ class MbamUI:
         self.logger.debug("Initialzing MBAMUI")
         self.model = None
         self.mongo = MMongo()
+        self.mongo.create_indexes()
         self.model_id = None
         self.iter = None
         self.data = MData()
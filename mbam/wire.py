@@ -0,0 +1,70 @@
+"""
+Decodes the messages sent by the Julia geodesic through geosender.jl.
+
+A message is either a single update dictionary, or a batch of updates sent
+together by ``GeoSender.send_batch``. Batches are sent as a JSON array, or,
+with the binary wire format, as a JSON header frame followed by one frame of
+raw float64 values per field.
+"""
+import json
+import numpy as np
+
+
+def recv_points(socket):
+    """Receives the next message from the Julia geodesic.
+
+    Parameters
+    ----------
+    socket : ``zmq.Socket``
+        The socket the Julia geodesic pushes its data to.
+
+    Returns
+    -------
+    points : ``list``
+        The update dictionaries in the message, in the order they were sent.
+        A Jacobian "j" is decoded into an array with the same shape it has in
+        Julia.
+    """
+    frames = socket.recv_multipart(copy=False)
+    if len(frames) > 1:
+        return decode_binary(frames)
+    data = json.loads(frames[0].bytes)
+    if not isinstance(data, list):
+        data = [data]
+    for point in data:
+        if "j" in point:
+            # JSON.jl writes a matrix as a list of its columns.
+            point["j"] = np.transpose(point["j"])
+    return data
+
+
+def decode_binary(frames):
+    """Decodes a binary batch without copying the float64 frames.
+
+    Parameters
+    ----------
+    frames : ``list`` of ``zmq.Frame``
+        The JSON header frame, followed by one frame per field listed in the
+        header, holding that field for the updates listed in its "rows".
+        Julia arrays are column-major, so each update's values are stored in
+        that order.
+
+    Returns
+    -------
+    points : ``list``
+        The update dictionaries in the batch. Each value is a read-only
+        ``numpy.ndarray`` view into the received frame.
+    """
+    header = json.loads(frames[0].bytes)
+    points = [{} for i in range(header["n"])]
+    for field, frame in zip(header["fields"], frames[1:]):
+        shape = field["shape"]
+        rows = field["rows"]
+        values = np.frombuffer(frame.buffer, dtype="<f8")
+        # The frame is shared by every update of the batch.
+        values.setflags(write=False)
+        values = values.reshape([len(rows)] + shape[::-1])
+        values = values.transpose([0] + list(range(len(shape), 0, -1)))
+        for k, i in enumerate(rows):
+            points[i][field["name"]] = values[k]
+    return points
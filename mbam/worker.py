@@ -0,0 +1,384 @@
+"""
+Runs geodesic scripts in a long-lived Julia process, julia_worker.jl, instead
+of starting Julia for every geodesic. Julia startup and the compilation of the
+packages used by the scripts are then only paid once per worker. A
+``WorkerPool`` shares several workers between concurrent geodesics.
+"""
+import subprocess
+import threading
+import time
+import collections
+import os
+import zmq
+from .geodesic import free_endpoint
+from .sysimage import julia_command
+
+# The worker script, next to geosender.jl.
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "julia_worker.jl")
+# The longest time in seconds a pool waits for a cancelled script to finish
+# before it replaces the worker.
+IDLE_TIMEOUT = 30
+
+
+class JuliaWorker:
+    """Starts julia_worker.jl and sends it requests over a ZMQ REQ socket.
+
+    The worker runs one geodesic script at a time.
+    """
+    def __init__(self, endpoint=None, script_path=WORKER_SCRIPT):
+        """
+        Parameters
+        ----------
+        endpoint : ``str``
+            The ZMQ address the worker listens on. Defaults to a free local
+            port.
+        script_path : ``str``
+            The path to julia_worker.jl.
+        """
+        self.endpoint = endpoint if endpoint else free_endpoint()
+        self.process = subprocess.Popen(julia_command() + [script_path, self.endpoint])
+        # REQ sockets are not thread safe, and geodesics are killed from
+        # their consumer threads.
+        self.lock = threading.Lock()
+        self.context = zmq.Context.instance()
+        self.connect()
+
+    def connect(self):
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(self.endpoint)
+
+    def request(self, cmd, timeout=None, **kwargs):
+        """Sends a request and waits for the reply.
+
+        Parameters
+        ----------
+        cmd : ``str``
+            One of "run", "cancel", "status" or "stop".
+        timeout : ``float``
+            The longest time in seconds to wait for the reply. By default,
+            waits as long as the worker is alive, which includes its startup.
+        **kwargs
+            The rest of the request.
+
+        Returns
+        -------
+        reply : ``dict``
+            The reply of the worker.
+        """
+        request = dict(kwargs, cmd=cmd)
+        with self.lock:
+            self.socket.send_json(request)
+            waited = 0
+            while not self.socket.poll(1000):
+                waited += 1
+                if self.process.poll() is not None or (timeout is not None and waited >= timeout):
+                    # A REQ socket cannot send again before it gets a reply.
+                    self.socket.close()
+                    self.connect()
+                    raise RuntimeError("No reply from the Julia worker to %s" %cmd)
+            return self.socket.recv_json()
+
+    def run(self, script, args):
+        """Starts a geodesic script.
+
+        Parameters
+        ----------
+        script : ``str``
+            The path to the generated geodesic script.
+        args : ``list``
+            The command line arguments the script reads from ARGS.
+
+        Returns
+        -------
+        job : ``WorkerJob``
+            The handle of the running script.
+        """
+        reply = self.request("run", script=os.path.abspath(script), args=[str(arg) for arg in args])
+        if not reply["ok"]:
+            raise RuntimeError("The Julia worker refused the script: %s" %reply["error"])
+        return WorkerJob(self, reply["job"])
+
+    def running(self, job):
+        """
+        Parameters
+        ----------
+        job : ``int``
+            The ID of a job started on the worker.
+
+        Returns
+        -------
+        ``bool``
+            True if the job is still running.
+        """
+        if self.process.poll() is not None:
+            return False
+        reply = self.request("status")
+        return reply["busy"] and reply["job"] == job
+
+    def wait_idle(self, timeout=None):
+        """Waits for the running job to finish.
+
+        Parameters
+        ----------
+        timeout : ``float``
+            The longest time in seconds to wait. By default, waits as long as
+            the worker is alive.
+
+        Returns
+        -------
+        ``bool``
+            True if the worker is alive and has no running job.
+        """
+        start = time.time()
+        while self.process.poll() is None:
+            if not self.request("status")["busy"]:
+                return True
+            if timeout is not None and time.time() - start >= timeout:
+                return False
+            time.sleep(.1)
+        return False
+
+    def cancel(self, job):
+        """Stops a job, if it is still running. Returns before the job has
+        finished, but the worker waits for it before it runs the next script.
+        """
+        if self.process.poll() is None:
+            self.request("cancel", job=job)
+
+    def stop(self):
+        """Stops the worker once its running job is done.
+        """
+        if self.process.poll() is None:
+            self.request("stop")
+        self.process.wait()
+        self.socket.close()
+
+
+class WorkerJob:
+    """The handle of a geodesic script running on a ``JuliaWorker``. Has the
+    same ``poll`` and ``kill`` methods ``Geodesic`` uses on a Julia
+    subprocess.
+    """
+    def __init__(self, worker, job):
+        """
+        Parameters
+        ----------
+        worker : ``JuliaWorker``
+            The worker running the script.
+        job : ``int``
+            The ID the worker gave the script.
+        """
+        self.worker = worker
+        self.job = job
+
+    def poll(self):
+        """
+        Returns
+        -------
+        ``int`` or ``None``
+            None while the script is running, otherwise 0.
+        """
+        return None if self.worker.running(self.job) else 0
+
+    def kill(self):
+        self.worker.cancel(self.job)
+
+
+class PoolTask:
+    """A geodesic submitted to a ``WorkerPool``.
+    """
+    def __init__(self, geodesic, owner, callback, push):
+        """
+        Parameters
+        ----------
+        geodesic : ``Geodesic``
+            The geodesic to run.
+        owner : ``str``
+            Who submitted the geodesic, e.g. the ID of the model being
+            reduced. Workers are shared fairly between owners.
+        callback : ``function``
+            Called with the task once it is done.
+        push : ``bool``
+            Passed on to ``Geodesic.run_geo_auto``.
+        """
+        self.geodesic = geodesic
+        self.owner = owner
+        self.callback = callback
+        self.push = push
+        self.limits = None
+        self.error = None
+        self.cancelled = False
+        # Set once the geodesic is started, so a cancel knows it can kill it.
+        self.started = False
+        self.done = threading.Event()
+
+    def result(self, timeout=None):
+        """Waits for the geodesic to finish. Raises the error the geodesic
+        failed with, if any.
+
+        Parameters
+        ----------
+        timeout : ``float``
+            The longest time in seconds to wait.
+
+        Returns
+        -------
+        limits : ``dict``
+            The limits found by the geodesic, ["EMPTY"] if it was cancelled,
+            or None if it is still running.
+        """
+        self.done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.limits
+
+
+class WorkerPool:
+    """Runs geodesics on a fixed set of ``JuliaWorker``, so independent
+    geodesics can use every core of the machine.
+
+    Waiting geodesics are queued per owner, and the owners take turns getting
+    the next free worker, so an owner submitting many geodesics cannot hold
+    up the others.
+    """
+    def __init__(self, size=None):
+        """
+        Parameters
+        ----------
+        size : ``int``
+            The number of workers. Defaults to the number of CPUs.
+        """
+        self.workers = [JuliaWorker() for _ in range(size if size else os.cpu_count())]
+        self.idle = list(self.workers)
+        # owner -> tasks waiting for a worker, in the order owners take turns
+        self.waiting = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.running = True
+        self.scheduler = threading.Thread(target=self.schedule, daemon=True)
+        self.scheduler.start()
+
+    def submit(self, geodesic, owner=None, callback=None, push=None):
+        """Queues a geodesic to run on the next free worker.
+
+        Parameters
+        ----------
+        geodesic : ``Geodesic``
+            The geodesic to run.
+        owner : ``str``
+            Who submitted the geodesic.
+        callback : ``function``
+            Called with the ``PoolTask`` once it is done, from a pool thread.
+        push : ``bool``
+            Passed on to ``Geodesic.run_geo_auto``.
+
+        Returns
+        -------
+        task : ``PoolTask``
+            The handle of the submitted geodesic.
+        """
+        task = PoolTask(geodesic, owner, callback, push)
+        with self.condition:
+            self.waiting.setdefault(owner, collections.deque()).append(task)
+            self.condition.notify()
+        return task
+
+    def cancel(self, task):
+        """Removes a task from the queue, or kills its geodesic if it is
+        already running. A geodesic being started is killed as soon as it is.
+        """
+        with self.condition:
+            tasks = self.waiting.get(task.owner)
+            task.cancelled = True
+            queued = tasks is not None and task in tasks
+            if queued:
+                tasks.remove(task)
+                if len(tasks) == 0:
+                    del self.waiting[task.owner]
+            started = task.started
+        if queued:
+            self.finish(task, ["EMPTY"])
+        elif started:
+            task.geodesic.kill()
+
+    def next_task(self):
+        """Takes the next task of the owner whose turn it is.
+        """
+        owner, tasks = next(iter(self.waiting.items()))
+        task = tasks.popleft()
+        # The owner goes to the back of the line.
+        del self.waiting[owner]
+        if len(tasks) > 0:
+            self.waiting[owner] = tasks
+        return task
+
+    def schedule(self):
+        while True:
+            with self.condition:
+                while self.running and (len(self.idle) == 0 or len(self.waiting) == 0):
+                    self.condition.wait()
+                if not self.running:
+                    return
+                task = self.next_task()
+                worker = self.idle.pop()
+            threading.Thread(target=self.run_task, args=(task, worker), daemon=True).start()
+
+    def run_task(self, task, worker):
+        limits = ["EMPTY"]
+        try:
+            if not task.cancelled:
+                task.geodesic.worker = worker
+                try:
+                    task.geodesic.start(task.push)
+                finally:
+                    with self.condition:
+                        task.started = True
+                        cancelled = task.cancelled
+                # Cancelled while starting, when there was nothing to kill yet.
+                if cancelled:
+                    task.geodesic.kill()
+                limits = task.geodesic.wait(task.push)
+        except Exception as e:
+            task.geodesic.kill()
+            task.error = e
+        # A killed geodesic can still be closing its sender.
+        try:
+            idle = worker.wait_idle(IDLE_TIMEOUT)
+        except RuntimeError:
+            idle = False
+        if not idle:
+            # The worker crashed or is stuck, start a new one in its place.
+            worker.process.kill()
+            worker.process.wait()
+            worker.socket.close()
+            replacement = JuliaWorker()
+            with self.condition:
+                self.workers.remove(worker)
+                self.workers.append(replacement)
+            worker = replacement
+        with self.condition:
+            self.idle.append(worker)
+            self.condition.notify()
+        self.finish(task, limits)
+
+    def finish(self, task, limits):
+        task.limits = limits
+        task.done.set()
+        if task.callback:
+            task.callback(task)
+
+    def shutdown(self):
+        """Cancels the waiting geodesics and stops the workers once the running
+        geodesics are done.
+        """
+        with self.condition:
+            self.running = False
+            waiting = [task for tasks in self.waiting.values() for task in tasks]
+            self.waiting.clear()
+            self.condition.notify_all()
+            workers = list(self.workers)
+        for task in waiting:
+            task.cancelled = True
+            self.finish(task, ["EMPTY"])
+        for worker in workers:
+            worker.stop()
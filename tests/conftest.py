@@ -0,0 +1,28 @@
+import pytest
+import mbam.mongo
+from mbam.mongo import MMongo
+
+
+def bulk_write(collection):
+    """mongomock's bulk_write does not accept the updates of newer pymongo
+    versions, so they are applied one by one, counting the calls.
+    """
+    collection.bulk_calls = 0
+
+    def write(requests):
+        collection.bulk_calls += 1
+        for request in requests:
+            collection.update_one(request._filter, request._doc, upsert=request._upsert)
+    return write
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """An ``MMongo`` on an in-memory database, with chunks of 4 points."""
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.setattr(mbam.mongo, "MongoClient", mongomock.MongoClient)
+    monkeypatch.setattr(mbam.mongo, "GEO_CHUNK_SIZE", 4)
+    mongo = MMongo()
+    mongo.create_indexes()
+    mongo.geo_chunks.bulk_write = bulk_write(mongo.geo_chunks)
+    return mongo
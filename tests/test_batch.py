@@ -0,0 +1,113 @@
+import json
+import os
+import mbam.engine
+from mbam.batch import batch, find_data, find_jobs, run_model
+from mbam.engine import Engine
+
+
+def touch(path):
+    path.write_text("")
+    return str(path)
+
+
+def test_find_data(tmp_path):
+    model = touch(tmp_path / "MM_4.json")
+    assert find_data(model) is None
+    touch(tmp_path / "MM_4_zeros.h5")
+    touch(tmp_path / "MM_4_b.h5")
+    assert find_data(model) == os.path.abspath(str(tmp_path / "MM_4_b.h5"))
+    exact = touch(tmp_path / "MM_4.h5")
+    assert find_data(model) == os.path.abspath(exact)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    assert find_data(model, str(data_dir)) is None
+
+
+def test_find_data_escapes_the_name(tmp_path):
+    model = touch(tmp_path / "M[1].json")
+    touch(tmp_path / "M1_zeros.h5")
+    assert find_data(model) is None
+    data = touch(tmp_path / "M[1]_zeros.h5")
+    assert find_data(model) == os.path.abspath(data)
+
+
+def test_find_jobs(tmp_path):
+    models = tmp_path / "models"
+    data = tmp_path / "data"
+    models.mkdir()
+    data.mkdir()
+    b = touch(models / "b.json")
+    a = touch(models / "a.json")
+    touch(models / "notes.txt")
+    a_data = touch(data / "a_zeros.h5")
+    assert find_jobs(str(models), str(data)) == [(os.path.abspath(a), os.path.abspath(a_data)),
+        (os.path.abspath(b), None)]
+    assert find_jobs(str(models)) == [(os.path.abspath(a), None), (os.path.abspath(b), None)]
+
+
+def test_batch_skips_models_without_data(tmp_path):
+    summary = batch([(str(tmp_path / "a.json"), None)])
+    assert summary["results"] == []
+    assert summary["skipped"] == [str(tmp_path / "a.json")]
+
+
+class FakeEngine:
+    def __init__(self, model_dict, data_path):
+        if model_dict["name"] == "broken":
+            raise RuntimeError("cannot parse the model")
+        self.model_id = "first"
+        self.curr_id = "first"
+
+    def run(self):
+        self.curr_id = "last"
+        return 2
+
+
+def test_run_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(mbam.engine, "Engine", FakeEngine)
+    model = tmp_path / "a.json"
+    model.write_text(json.dumps({"name": "a"}))
+    result = run_model(str(model), "a.h5")
+    assert result["model_id"] == "first"
+    assert result["final_id"] == "last"
+    assert result["reductions"] == 2
+    assert result["error"] is None
+    model.write_text(json.dumps({"name": "broken"}))
+    result = run_model(str(model), "a.h5")
+    assert result["reductions"] == 0
+    assert "cannot parse the model" in result["error"]
+
+
+class FakeModel:
+    name = "MM_4"
+    model_ps = ["a", "b"]
+
+
+class FakeParser:
+    options = {}
+
+
+class FakeIteration:
+    names = []
+
+    def __init__(self, model, model_id, data_path, data_hash=None):
+        self.names.append(model.name)
+        self.julia = FakeParser()
+
+    def write_model_script(self, options):
+        pass
+
+    def auto_run(self):
+        return False
+
+
+def test_engine_scripts_are_named_with_the_model_id(monkeypatch):
+    monkeypatch.setattr(mbam.engine, "Iteration", FakeIteration)
+    monkeypatch.setattr(mbam.engine, "data_fingerprint", lambda data_path: "data")
+    engine = Engine.__new__(Engine)
+    engine.data_path = "data.h5"
+    engine.curr_model = FakeModel()
+    engine.curr_id = "5f01"
+    assert engine.run() == 0
+    assert FakeIteration.names == ["MM_4_5f01"]
+    assert engine.curr_model.name == "MM_4"
@@ -0,0 +1,56 @@
+import numpy as np
+from mbam.detection import LimitDetector, StabilityPolicy
+
+
+def test_empty_blocks_are_skipped():
+    detector = LimitDetector(StabilityPolicy(window=2))
+    for vs in ([], np.empty((0,)), np.empty((0, 3))):
+        assert not detector.update(vs, [])
+    assert detector.limits is None
+    assert detector.rows == 0
+
+
+def test_empty_block_keeps_the_run():
+    detector = LimitDetector(StabilityPolicy(window=2))
+    assert not detector.update([[1.0, 0.0, 0.0]])
+    assert not detector.update(np.empty((0,)))
+    assert detector.update([[1.0, 0.0, 0.0]])
+    assert detector.limits == {"0": "inf"}
+    assert detector.stable_row == 1
+
+
+def test_default_window_does_not_depend_on_batching():
+    rows = [[1.0, 0.0, 0.0]] * 7
+    one_block = LimitDetector()
+    assert one_block.update(rows)
+    per_row = LimitDetector()
+    for row in rows[:-1]:
+        assert not per_row.update([row])
+    assert per_row.update([rows[-1]])
+    assert one_block.stable_row == per_row.stable_row == 6
+
+
+def test_min_tau_delays_stability():
+    detector = LimitDetector(StabilityPolicy(window=2, min_tau=0.5))
+    rows = [[1.0, 0.0, 0.0]] * 4
+    assert detector.update(rows, [0.1, 0.2, 0.5, 0.6])
+    assert detector.stable_row == 2
+    # without geodesic times the minimum can never be checked
+    assert not LimitDetector(StabilityPolicy(window=2, min_tau=0.5)).update(rows)
+
+
+def test_margin_requires_a_clearer_gap():
+    rows = [[1.0, 0.1, 0.0]] * 2
+    assert LimitDetector(StabilityPolicy(window=2)).update(rows)
+    assert not LimitDetector(StabilityPolicy(window=2, margin=0.3)).update(rows)
+
+
+def test_policy_can_be_subclassed():
+    class FirstHit(StabilityPolicy):
+        def stable(self, runs, taus=None):
+            return runs >= 1
+
+    detector = LimitDetector(FirstHit())
+    assert detector.update([[0.0, 0.0, 0.0], [0.0, -1.0, 0.0]])
+    assert detector.limits == {"1": "zero"}
+    assert detector.stable_row == 1
@@ -0,0 +1,115 @@
+import copy
+import json
+import os
+import pytest
+import mbam.iteration
+from mbam.engine import model_from_dict
+from mbam.fingerprint import data_fingerprint, fingerprint, rename_expr, rename_model_dict
+from mbam.iteration import Iteration
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples", "models",
+    "MM_4.json")
+# Names SymPy gives a meaning of its own.
+RENAMES = {"K_1": "E", "k_1": "beta", "K_2": "gamma", "x_1": "I", "x_1dot": "Idot"}
+
+
+def model_dict():
+    with open(MODEL_PATH) as f:
+        return json.load(f)
+
+
+def test_rename_expr_keeps_sympy_names_as_symbols():
+    names = {"E": "mbamp0", "beta": "mbamp1", "I": "mbamv0", "N": "mbamp2"}
+    assert rename_expr("E*I + beta/N", names) == "mbamp0*mbamv0 + mbamp1/mbamp2"
+    back = {canon: name for name, canon in names.items()}
+    assert rename_expr("mbamp0*mbamv0 + mbamp1/mbamp2", back) == "E*I + beta/N"
+    assert rename_expr("a = S + Q", {"S": "b", "Q": "c"}) == "a = b + c"
+
+
+def test_renaming_round_trip():
+    model = model_from_dict(model_dict())
+    renamed = rename_model_dict(model.str_dict, RENAMES)
+    back = rename_model_dict(renamed, {name: old for old, name in RENAMES.items()})
+    assert rename_model_dict(back, RENAMES) == renamed
+    assert [p["name"] for p in back["ps"]] == [p["name"] for p in model.str_dict["ps"]]
+
+
+def test_fingerprint_only_ignores_renaming():
+    model = model_from_dict(model_dict())
+    renamed = model_from_dict(rename_model_dict(model.str_dict, RENAMES))
+    assert fingerprint(renamed) == fingerprint(model)
+    reordered = model_dict()
+    reordered["ps"] = reordered["ps"][::-1]
+    assert fingerprint(model_from_dict(reordered)) != fingerprint(model)
+    changed = model_dict()
+    changed["ps"][8]["init_val"] = 2.0
+    assert fingerprint(model_from_dict(changed)) != fingerprint(model)
+
+
+def test_data_fingerprint_follows_the_contents(tmp_path):
+    path = tmp_path / "data.h5"
+    path.write_bytes(b"data")
+    first = data_fingerprint(str(path))
+    assert data_fingerprint(str(path)) == first
+    path.write_bytes(b"other data")
+    assert data_fingerprint(str(path)) != first
+
+
+def reduced_dict(model):
+    """The model with k_1 and K_1 merged into k_1/K_1, as a limit of both
+    going to infinity would.
+    """
+    reduced = copy.deepcopy(model.str_dict)
+    reduced["ps"] = [p for p in reduced["ps"] if p["name"] not in ("k_1", "K_1")]
+    reduced["ps"].append({"name": "k_1_over_K_1", "init_val": 0.8, "transform": "log"})
+    reduced["res"]["eqs"][1] = "x_1*x_2_inact*k_1_over_K_1-x_2dot"
+    return reduced
+
+
+@pytest.fixture
+def iteration(mongo, monkeypatch, tmp_path):
+    """Makes Iterations sharing `mongo`, with scripts written to `tmp_path`."""
+    monkeypatch.setattr(mbam.iteration, "MMongo", lambda: mongo)
+    monkeypatch.chdir(tmp_path)
+
+    def iteration(model, data_hash="data"):
+        return Iteration(model, "5f0000000000000000000000", str(tmp_path / "data.h5"), data_hash=data_hash)
+    return iteration
+
+
+def test_cache_hit_is_renamed(iteration):
+    model = model_from_dict(model_dict())
+    first = iteration(model)
+    assert not first.from_fingerprint()
+    first.limits = {"K_1": "inf", "k_1": "inf"}
+    first.ftildes = [{"theta": "k_1", "tilde": "k_1_over_K_1", "limit": "inf", "f": "k_1/K_1",
+        "f_inv": "K_1*k_1_over_K_1"}]
+    first.N_minus_1 = model_from_dict(reduced_dict(model))
+    first.geo_id = "geo"
+    first.save_fingerprint()
+
+    second = iteration(model_from_dict(rename_model_dict(model.str_dict, RENAMES)))
+    assert second.from_fingerprint()
+    assert second.limits == {"E": "inf", "beta": "inf"}
+    assert str(second.ftildes[0]["tilde"]) == "beta_over_E"
+    assert str(second.ftildes[0]["f_inv"]) == "E*beta_over_E"
+    assert second.ftildes[0]["theta"].is_Symbol
+    ps = [p["name"] for p in second.N_minus_1.str_dict["ps"]]
+    assert "beta_over_E" in ps and "E" not in ps
+    assert "I*beta_over_E" in second.N_minus_1.str_dict["res"]["eqs"][1]
+    assert second.geo_id == "geo"
+
+
+def test_cache_misses(iteration):
+    model = model_from_dict(model_dict())
+    first = iteration(model)
+    first.limits = {"K_1": "inf", "k_1": "inf"}
+    first.ftildes = [{"theta": "k_1", "tilde": "k_1_over_K_1", "limit": "inf", "f": "k_1/K_1",
+        "f_inv": "K_1*k_1_over_K_1"}]
+    first.N_minus_1 = model_from_dict(reduced_dict(model))
+    first.save_fingerprint()
+    assert not iteration(model, data_hash="other data").from_fingerprint()
+    changed = model_dict()
+    changed["ps"][8]["init_val"] = 2.0
+    assert not iteration(model_from_dict(changed)).from_fingerprint()
+    assert iteration(model).from_fingerprint()
@@ -0,0 +1,209 @@
+import json
+import threading
+import pytest
+import zmq
+import mbam.geodesic
+from mbam.detection import LimitDetector, StabilityPolicy
+from mbam.geodesic import Geodesic, GeodesicConsumer, GeodesicEnsemble
+from mbam.trajectory import TrajectoryBuffer
+
+
+class FakeMongo:
+    def __init__(self):
+        self.calls = []
+
+    def push_geodesic_many(self, geo_id, data_list):
+        self.calls.append(("points", len(data_list)))
+
+    def checkpoint_geodesic(self, geo_id, data):
+        self.calls.append(("checkpoint", data["checkpoint"]))
+
+    def finish_geodesic(self, geo_id, exception=False, data=None):
+        self.calls.append(("done", data["done"]))
+
+
+class FakeProcess:
+    def __init__(self):
+        self.killed = False
+
+    def poll(self):
+        return None
+
+    def kill(self):
+        self.killed = True
+
+
+def fake_geodesic(endpoint):
+    """A Geodesic without MongoDB or Julia."""
+    geodesic = Geodesic.__new__(Geodesic)
+    geodesic.mongo = FakeMongo()
+    geodesic.geo_id = "geo"
+    geodesic.flush_size = 50
+    geodesic.endpoint = endpoint
+    geodesic.detector = LimitDetector(StabilityPolicy(window=2))
+    geodesic.buffer = TrajectoryBuffer()
+    geodesic.n_read = 0
+    geodesic.limits = []
+    geodesic.reason = None
+    geodesic.finished = threading.Event()
+    geodesic.kill_lock = threading.Lock()
+    geodesic.killed = False
+    geodesic.geo_run = FakeProcess()
+    geodesic.consumer = None
+    geodesic.data_collect_run = None
+    return geodesic
+
+
+def point(v, tau):
+    return {"x": [1.0, 1.0], "v": v, "t": [tau], "tau": [tau]}
+
+
+def test_checkpoint_only_message():
+    endpoint = "inproc://test-checkpoint-only"
+    geodesic = fake_geodesic(endpoint)
+    consumer = GeodesicConsumer(geodesic, endpoint)
+    geodesic.consumer = consumer
+    sender = zmq.Context.instance().socket(zmq.PUSH)
+    sender.connect(endpoint)
+    consumer.start()
+    try:
+        sender.send_string(json.dumps([point([0.1, 0.1], 0.1)]))
+        sender.send_string(json.dumps(dict(point([0.1, 0.1], 0.1), checkpoint=1)))
+        sender.send_string(json.dumps([point([1.0, 0.0], 0.2), point([1.0, 0.0], 0.3)]))
+        assert geodesic.finished.wait(5)
+    finally:
+        consumer.stop()
+        consumer.join(5)
+        sender.close()
+    assert not consumer.is_alive()
+    assert geodesic.limits == {"0": "inf"}
+    assert geodesic.n_read == 3
+    consumer.writer.join(5)
+    assert ("checkpoint", 1) in geodesic.mongo.calls
+
+
+def test_stable_limit_kills_the_geodesic():
+    geodesic = fake_geodesic("inproc://unused")
+    process = geodesic.geo_run
+    geodesic.consume({"x": [[1.0, 1.0]], "v": [[1.0, 0.0]], "t": [0.1], "tau": [0.1]})
+    assert not process.killed and not geodesic.finished.is_set()
+    geodesic.consume({"x": [[1.0, 1.0]], "v": [[1.0, 0.0]], "t": [0.2], "tau": [0.2]})
+    assert geodesic.finished.is_set()
+    assert geodesic.limits == {"0": "inf"}
+    assert process.killed and geodesic.killed
+
+
+def test_kill_before_start_is_not_recorded():
+    geodesic = fake_geodesic("inproc://unused")
+    geodesic.geo_run = None
+    geodesic.kill()
+    assert not geodesic.killed
+    geodesic.geo_run = FakeProcess()
+    geodesic.kill()
+    assert geodesic.geo_run.killed
+
+
+class FakeModel:
+    model_ps = ["a", "b"]
+
+
+class FakeParser:
+    file_path = "model.jl"
+
+    def __init__(self):
+        self.mm = FakeModel()
+        self.resumed = []
+
+    def resume_script(self, checkpoint, geo_id):
+        self.resumed.append((checkpoint["n"], geo_id))
+        return "model_resume_{0}.jl".format(geo_id)
+
+
+def test_resume_continues_the_stored_geodesic(mongo, monkeypatch):
+    monkeypatch.setattr(mbam.geodesic, "MMongo", lambda: mongo)
+    geo_id = mongo.init_geodesic()
+    mongo.push_geodesic_many(geo_id, [point([0.1, 0.1], 0.1), point([0.1, 0.2], 0.2)])
+    mongo.checkpoint_geodesic(geo_id, point([0.1, 0.2], 0.2))
+    mongo.push_geodesic_many(geo_id, [point([0.1, 0.3], 0.3)])
+    mongo.finish_geodesic(geo_id, exception=True, data={"done": 1})
+    parser = FakeParser()
+    geodesic = Geodesic(parser, "juliatomongo.py", geo_id=geo_id)
+    assert mongo.geo.count_documents({}) == 1
+    run_paths = []
+    geodesic.run_geo_auto = lambda push=None: run_paths.append(geodesic.path) or ["EMPTY"]
+    assert geodesic.resume() == ["EMPTY"]
+    assert parser.resumed == [(2, geo_id)]
+    assert run_paths == ["model_resume_{0}.jl".format(geo_id)]
+    assert geodesic.path == "model.jl"
+    assert geodesic.n_read == 2
+    assert mongo.geo.find_one()["n"] == 2
+    assert "done" not in mongo.geo.find_one()
+
+
+class FakeMember:
+    """A geodesic of an ensemble that finds the given limits."""
+    def __init__(self, geo_id, limits, fail=False):
+        self.geo_id = geo_id
+        self.limits = limits
+        self.fail = fail
+        self.started = False
+        self.killed = False
+
+    def start(self, push=None):
+        if self.fail:
+            raise RuntimeError("failed to start")
+        self.started = True
+
+    def wait(self, push=None):
+        return self.limits
+
+    def kill(self):
+        self.killed = True
+
+
+def fake_ensemble(members, agree=1, fallback=False):
+    ensemble = GeodesicEnsemble.__new__(GeodesicEnsemble)
+    ensemble.agree = agree
+    ensemble.fallback = fallback
+    ensemble.geodesics = members
+    ensemble.geo_id = members[0].geo_id
+    ensemble.limits = []
+    return ensemble
+
+
+def test_ensemble_keeps_the_agreed_limit():
+    inf, zero = {"0": "inf"}, {"1": "zero"}
+    members = [FakeMember("a", zero), FakeMember("b", inf), FakeMember("c", ["EMPTY"]), FakeMember("d", inf)]
+    ensemble = fake_ensemble(members, agree=2)
+    assert ensemble.run_geo_auto() == inf
+    assert ensemble.geo_id in ("b", "d")
+    assert all(member.killed for member in members)
+
+
+def test_ensemble_without_agreement():
+    members = [FakeMember("a", {"0": "inf"}), FakeMember("b", {"1": "zero"}), FakeMember("c", ["EMPTY"])]
+    assert fake_ensemble(members, agree=2).run_geo_auto() == ["EMPTY"]
+    members = [FakeMember("a", ["EMPTY"]), FakeMember("b", {"1": "zero"}), FakeMember("c", ["EMPTY"])]
+    ensemble = fake_ensemble(members, agree=2, fallback=True)
+    assert ensemble.run_geo_auto() == {"1": "zero"}
+    assert ensemble.geo_id == "b"
+    members = [FakeMember("a", ["EMPTY"]), FakeMember("b", ["EMPTY"])]
+    assert fake_ensemble(members, fallback=True).run_geo_auto() == ["EMPTY"]
+
+
+def test_ensemble_kills_started_geodesics_if_one_fails():
+    members = [FakeMember("a", {"0": "inf"}), FakeMember("b", {"0": "inf"}, fail=True)]
+    with pytest.raises(RuntimeError):
+        fake_ensemble(members).run_geo_auto()
+    assert members[0].started and members[0].killed
+
+
+@pytest.mark.parametrize("direction", [-1, 2])
+def test_direction_must_be_a_parameter(direction):
+    with pytest.raises(RuntimeError):
+        Geodesic(FakeParser(), "juliatomongo.py", direction=direction)
+
+
+def test_directions_must_be_parameters():
+    with pytest.raises(RuntimeError):
+        GeodesicEnsemble(FakeParser(), "juliatomongo.py", directions=3)
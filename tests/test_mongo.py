@@ -0,0 +1,58 @@
+import numpy as np
+import mbam.mongo
+
+
+def points(start, stop):
+    return [{"x": [float(i), 1.0], "v": [1.0, 0.0], "t": [float(i)], "tau": [float(i)]}
+        for i in range(start, stop)]
+
+
+def test_chunks_are_filled_in_order(mongo):
+    geo_id = mongo.init_geodesic()
+    mongo.push_geodesic_many(geo_id, points(0, 3))
+    mongo.push_geodesic_many(geo_id, points(3, 10))
+    assert mongo.geo.find_one()["n"] == 10
+    assert mongo.geo_chunks.bulk_calls == 2
+    chunks = list(mongo.geo_chunks.find({"geo_id": geo_id}).sort("seq", 1))
+    assert [len(chunk["tau"]) for chunk in chunks] == [4, 4, 2]
+    taus = [tau for chunk in chunks for tau in chunk["tau"]]
+    assert taus == [float(i) for i in range(10)]
+
+
+def test_query_geodesic_range(mongo):
+    geo_id = mongo.init_geodesic()
+    mongo.push_geodesic_many(geo_id, points(0, 10))
+    geo_data = mongo.query_geodesic_range(geo_id, 3, 9)
+    assert geo_data["tau"].tolist() == [3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+    assert geo_data["x"].shape == (6, 2)
+    assert mongo.query_geodesic_range(geo_id, 8)["t"].tolist() == [8.0, 9.0]
+    assert mongo.query_geodesic_range(geo_id, 10)["v"].shape[0] == 0
+    assert "done" not in geo_data
+
+
+def test_rewind_resets_the_tracked_rows(mongo):
+    geo_id = mongo.init_geodesic()
+    mongo.push_geodesic_many(geo_id, points(0, 3))
+    mongo.checkpoint_geodesic(geo_id, dict(points(2, 3)[0], checkpoint=1))
+    mongo.push_geodesic_many(geo_id, points(3, 6))
+    mongo.rewind_geodesic(geo_id)
+    mongo.push_geodesic_many(geo_id, points(3, 5))
+    geo_data = mongo.query_geodesic_range(geo_id, 0)
+    assert geo_data["tau"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    np.testing.assert_array_equal(geo_data["x"][:, 0], geo_data["tau"])
+
+
+def test_file_store_matches_chunks(mongo, tmp_path, monkeypatch):
+    monkeypatch.setattr(mbam.mongo, "TRAJECTORY_DIR", str(tmp_path))
+    chunk_id = mongo.init_geodesic()
+    file_id = mongo.init_geodesic("files")
+    for geo_id in (chunk_id, file_id):
+        assert mongo.query_geodesic_range(geo_id, 0)["x"].shape == (0, 0)
+        mongo.push_geodesic_many(geo_id, points(0, 6))
+        mongo.finish_geodesic(geo_id, data={"done": 1, "reason": "max_steps"})
+    chunk_data = mongo.query_geodesic_range(chunk_id, 2, 5)
+    file_data = mongo.query_geodesic_range(file_id, 2, 5)
+    for key in ("x", "v", "t", "tau"):
+        np.testing.assert_array_equal(chunk_data[key], file_data[key])
+    assert file_data["reason"] == chunk_data["reason"] == "max_steps"
+    assert mongo.query_geodesic_range(file_id, 6)["v"].shape == (0, 0)
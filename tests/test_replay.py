@@ -0,0 +1,54 @@
+from mbam.detection import StabilityPolicy
+from mbam.replay import replay_geodesic, stored_geodesics
+
+
+def baseline_geodesic(mongo, n, done="done"):
+    """Inserts a geodesic the way it was stored before the chunked schema,
+    with every point pushed to arrays of the geodesic document.
+    """
+    post = {
+        "t": [0.1 * i for i in range(n)],
+        "tau": [0.1 * i for i in range(n)],
+        "v": [[1.0, 0.0]] * n,
+        "x": [[1.0, 1.0]] * n,
+    }
+    if done:
+        post["done"] = done
+    return str(mongo.geo.insert_one(post).inserted_id)
+
+
+def test_baseline_geodesics_are_listed(mongo):
+    old = baseline_geodesic(mongo, 5)
+    running = baseline_geodesic(mongo, 3, done=None)
+    baseline_geodesic(mongo, 0)
+    new = mongo.init_geodesic()
+    mongo.push_geodesic_many(new, [{"x": [1.0], "v": [1.0], "t": [0.0], "tau": [0.0]}])
+    mongo.init_geodesic()
+    assert sorted(stored_geodesics(mongo)) == sorted([old, running, new])
+    assert stored_geodesics(mongo, done=True) == [old]
+    assert sorted(stored_geodesics(mongo, done=False)) == sorted([running, new])
+
+
+def test_baseline_geodesic_is_replayed(mongo):
+    geo_id = baseline_geodesic(mongo, 12)
+    queries = []
+    query = mongo.query_geodesic_range
+    mongo.query_geodesic_range = lambda *args: queries.append(args) or query(*args)
+    result = replay_geodesic(geo_id, StabilityPolicy(window=10), mongo=mongo, block=4)
+    assert len(queries) == 1
+    assert result["limits"] == {"0": "inf"}
+    assert result["stable"]
+    assert result["row"] == 9
+    assert abs(result["tau"] - 0.9) < 1e-12
+    assert result["n"] == 12
+    assert result["done"] == "done"
+
+
+def test_chunked_geodesic_is_replayed(mongo):
+    geo_id = mongo.init_geodesic()
+    mongo.push_geodesic_many(geo_id, [{"x": [1.0, 1.0], "v": [0.0, 0.0], "t": [0.0], "tau": [0.0]}] * 6)
+    result = replay_geodesic(geo_id, mongo=mongo, block=4)
+    assert result["limits"] is None
+    assert not result["stable"]
+    assert result["n"] == 6
+    assert result["done"] is None
@@ -0,0 +1,25 @@
+import subprocess
+import pytest
+from mbam import sysimage
+
+
+class Completed:
+    def __init__(self, returncode):
+        self.returncode = returncode
+
+
+def test_missing_package_compiler(monkeypatch, tmp_path):
+    commands = []
+    monkeypatch.setattr(subprocess, "run", lambda command: commands.append(command) or Completed(1))
+    with pytest.raises(RuntimeError, match="PackageCompiler"):
+        sysimage.build_sysimage(str(tmp_path / "image.so"))
+    assert len(commands) == 1
+
+
+def test_build_uses_the_precompile_script(monkeypatch, tmp_path):
+    commands = []
+    monkeypatch.setattr(subprocess, "run", lambda command: commands.append(command) or Completed(0))
+    assert sysimage.build_sysimage(str(tmp_path / "image.so"), packages=("ZMQ", "JSON"))
+    build = commands[-1][-1]
+    assert "create_sysimage([:ZMQ, :JSON]" in build
+    assert "image.so" in build
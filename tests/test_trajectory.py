@@ -0,0 +1,84 @@
+import numpy as np
+from mbam.trajectory import TrajectoryBuffer, TrajectoryWriter, read_column
+
+
+def points(start, stop, j=False):
+    data_list = []
+    for i in range(start, stop):
+        data = {"x": [float(i), 1.0], "v": [1.0, 0.0], "t": [float(i)], "tau": [float(i)]}
+        if j:
+            data["j"] = [[float(i), 0.0], [0.0, 1.0]]
+        data_list.append(data)
+    return data_list
+
+
+def test_appended_rows_are_read_back(tmp_path):
+    writer = TrajectoryWriter(str(tmp_path / "geo"))
+    assert writer.append(points(0, 3)) == 0
+    assert writer.append(points(3, 5, j=True)) == 2
+    writer.close()
+    x = read_column(writer.path("x"), 5)
+    assert x.shape == (5, 2)
+    assert x[:, 0].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert read_column(writer.path("tau"), 5, 1, 3).tolist() == [1.0, 2.0]
+    assert read_column(writer.path("j"), 2).shape == (2, 2, 2)
+    assert read_column(writer.path("j_tau"), 2).tolist() == [3.0, 4.0]
+
+
+def test_only_the_counted_rows_are_read(tmp_path):
+    writer = TrajectoryWriter(str(tmp_path / "geo"))
+    writer.append(points(0, 4))
+    assert read_column(writer.path("t"), 2).tolist() == [0.0, 1.0]
+    writer.close()
+
+
+def test_empty_column_keeps_the_row_shape(tmp_path):
+    writer = TrajectoryWriter(str(tmp_path / "geo"))
+    writer.append(points(0, 2))
+    writer.close()
+    assert read_column(writer.path("x"), 0).shape == (0, 2)
+    assert read_column(writer.path("t"), 0).shape == (0,)
+    assert read_column(writer.path("j"), 0).shape == (0,)
+
+
+def test_resumed_writer_overwrites_later_rows(tmp_path):
+    writer = TrajectoryWriter(str(tmp_path / "geo"))
+    writer.append(points(0, 5))
+    writer.close()
+    writer = TrajectoryWriter(writer.directory, rows={"x": 2, "v": 2, "t": 2, "tau": 2})
+    writer.append(points(7, 8))
+    writer.close()
+    assert read_column(writer.path("tau"), 3).tolist() == [0.0, 1.0, 7.0]
+    assert np.load(writer.path("x")).shape == (3, 2)
+
+
+def test_buffer_grows_and_keeps_rows():
+    buffer = TrajectoryBuffer(capacity=2)
+    assert buffer.view("v").shape == (0,)
+    for start in range(0, 9, 3):
+        rows = points(start, start + 3)
+        buffer.append({key: [row[key] for row in rows] for key in ("x", "v", "t", "tau")})
+    assert len(buffer) == 9
+    assert buffer.capacity >= 9
+    assert buffer.view("x").shape == (9, 2)
+    assert buffer.view("t").shape == (9, 1)
+    assert buffer.view("x")[:, 0].tolist() == [float(i) for i in range(9)]
+
+
+def test_buffer_skips_empty_rows():
+    buffer = TrajectoryBuffer(capacity=2)
+    buffer.append({"x": [], "v": [], "t": [], "tau": []})
+    assert len(buffer) == 0
+    buffer.append({"x": [[1.0, 2.0]], "v": [[0.0, 1.0]], "t": [0.5], "tau": [0.5]})
+    buffer.append({"x": np.empty((0, 2)), "v": np.empty((0, 2)), "t": [], "tau": []})
+    assert len(buffer) == 1
+    assert buffer.view("tau").tolist() == [0.5]
+
+
+def test_buffer_views_are_not_changed_by_growing():
+    buffer = TrajectoryBuffer(capacity=1)
+    buffer.append({"x": [[1.0]], "v": [[1.0]], "t": [0.0], "tau": [0.0]})
+    view = buffer.view("tau")
+    buffer.append({"x": [[2.0], [3.0]], "v": [[1.0], [1.0]], "t": [1.0, 2.0], "tau": [1.0, 2.0]})
+    assert view.tolist() == [0.0]
+    assert buffer.view("tau").tolist() == [0.0, 1.0, 2.0]
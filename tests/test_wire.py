@@ -0,0 +1,63 @@
+import json
+import numpy as np
+import pytest
+import zmq
+from mbam.wire import recv_points
+
+
+@pytest.fixture
+def sockets(request):
+    endpoint = "inproc://" + request.node.name
+    context = zmq.Context.instance()
+    rec = context.socket(zmq.PULL)
+    rec.bind(endpoint)
+    sender = context.socket(zmq.PUSH)
+    sender.connect(endpoint)
+    yield sender, rec
+    sender.close()
+    rec.close()
+
+
+def send_binary(sender, batch):
+    """Sends a batch the way GeoSender.send_binary does, with each array in
+    column-major order.
+    """
+    fields = []
+    frames = []
+    for name in ("x", "v", "tau", "t", "j"):
+        rows = [i for i, update in enumerate(batch) if name in update]
+        if rows:
+            shape = list(np.shape(batch[rows[0]][name]))
+            fields.append({"name": name, "shape": shape, "rows": rows})
+            frames.append(np.concatenate([np.ravel(batch[i][name], order="F") for i in rows]).astype("<f8"))
+    sender.send_multipart([json.dumps({"n": len(batch), "fields": fields}).encode()] + frames)
+
+
+def test_binary_batch(sockets):
+    sender, rec = sockets
+    j = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    batch = [
+        {"x": [1.0, 2.0, 3.0], "v": [0.1, 0.2, 0.3], "tau": [0.5], "t": [0.5]},
+        {"x": [1.5, 2.5, 3.5], "v": [0.4, 0.5, 0.6], "tau": [0.6], "t": [0.6], "j": j},
+    ]
+    send_binary(sender, batch)
+    points = recv_points(rec)
+    assert len(points) == 2
+    for point, update in zip(points, batch):
+        for key, val in update.items():
+            np.testing.assert_array_equal(point[key], val)
+    assert "j" not in points[0]
+    assert points[1]["j"].shape == (2, 3)
+    assert not points[1]["x"].flags.writeable
+
+
+def test_json_messages(sockets):
+    sender, rec = sockets
+    sender.send_string(json.dumps({"done": 1, "reason": "max_steps"}))
+    assert recv_points(rec) == [{"done": 1, "reason": "max_steps"}]
+    # JSON.jl writes a matrix as a list of its columns.
+    point = {"x": [1.0, 2.0], "v": [0.0, 1.0], "tau": [0.1], "t": [0.1], "j": [[1.0, 3.0], [2.0, 4.0]]}
+    sender.send_string(json.dumps([point, {"checkpoint": 1}]))
+    points = recv_points(rec)
+    assert points[0]["j"].tolist() == [[1.0, 2.0], [3.0, 4.0]]
+    assert points[1] == {"checkpoint": 1}
@@ -0,0 +1,147 @@
+import threading
+import pytest
+import mbam.worker
+from mbam.worker import WorkerPool
+
+
+class FakeProcess:
+    def __init__(self):
+        self.killed = False
+
+    def kill(self):
+        self.killed = True
+
+    def wait(self):
+        pass
+
+
+class FakeSocket:
+    def close(self):
+        pass
+
+
+class FakeWorker:
+    """A JuliaWorker without Julia, idle unless told otherwise."""
+    def __init__(self):
+        self.process = FakeProcess()
+        self.socket = FakeSocket()
+        self.idle = True
+        self.stopped = False
+
+    def wait_idle(self, timeout=None):
+        return self.idle
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeGeodesic:
+    """A geodesic that finds `limits`, optionally blocking until released
+    once it has started.
+    """
+    def __init__(self, name, log, limits=None, error=None, block=False):
+        self.name = name
+        self.log = log
+        self.limits = limits if limits else {"0": "inf"}
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self.kills = 0
+        self.worker = None
+
+    def start(self, push=None):
+        self.log.append(self.name)
+        self.started.set()
+
+    def wait(self, push=None):
+        assert self.release.wait(5)
+        if self.error:
+            raise self.error
+        return self.limits
+
+    def kill(self):
+        self.kills += 1
+        self.release.set()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(mbam.worker, "JuliaWorker", FakeWorker)
+    pool = WorkerPool(1)
+    yield pool
+    pool.shutdown()
+
+
+def test_owners_take_turns(pool):
+    log = []
+    first = FakeGeodesic("a1", log, block=True)
+    tasks = [pool.submit(first, owner="a")]
+    assert first.started.wait(5)
+    for name, owner in (("a2", "a"), ("a3", "a"), ("b1", "b")):
+        tasks.append(pool.submit(FakeGeodesic(name, log), owner=owner))
+    first.release.set()
+    for task in tasks:
+        assert task.result(5) == {"0": "inf"}
+    assert log == ["a1", "a2", "b1", "a3"]
+    assert all(geodesic.worker is pool.workers[0] for geodesic in (task.geodesic for task in tasks))
+
+
+def test_result_raises_the_error(pool):
+    task = pool.submit(FakeGeodesic("a", [], error=RuntimeError("crashed")))
+    with pytest.raises(RuntimeError, match="crashed"):
+        task.result(5)
+    assert task.geodesic.kills == 1
+
+
+def test_cancel_queued_task(pool):
+    log = []
+    first = FakeGeodesic("a", log, block=True)
+    pool.submit(first)
+    assert first.started.wait(5)
+    queued = pool.submit(FakeGeodesic("b", log))
+    pool.cancel(queued)
+    assert queued.result(5) == ["EMPTY"]
+    first.release.set()
+    pool.submit(FakeGeodesic("c", log)).result(5)
+    assert log == ["a", "c"]
+
+
+def test_cancel_running_task(pool):
+    geodesic = FakeGeodesic("a", [], block=True)
+    task = pool.submit(geodesic)
+    assert geodesic.started.wait(5)
+    pool.cancel(task)
+    assert task.result(5) == {"0": "inf"}
+    assert geodesic.kills == 1
+
+
+def test_cancel_while_starting_kills_once_started(pool):
+    geodesic = FakeGeodesic("a", [], block=True)
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    def start(push=None):
+        started.set()
+        # The cancel arrives before there is anything to kill.
+        assert cancelled.wait(5)
+    geodesic.start = start
+    task = pool.submit(geodesic)
+    assert started.wait(5)
+    pool.cancel(task)
+    assert geodesic.kills == 0
+    cancelled.set()
+    task.result(5)
+    assert geodesic.kills == 1
+
+
+def test_stuck_worker_is_replaced(pool):
+    stuck = pool.workers[0]
+    stuck.idle = False
+    pool.submit(FakeGeodesic("a", [])).result(5)
+    assert stuck.process.killed
+    assert pool.workers != [stuck] and len(pool.workers) == 1
+    geodesic = FakeGeodesic("b", [])
+    pool.submit(geodesic).result(5)
+    assert geodesic.worker is pool.workers[0]